@@ -0,0 +1,267 @@
+import os
+import sys
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+from typing import Type
+from typing import TYPE_CHECKING
+
+import click
+
+from pytuber import __version__
+from pytuber.core.models import Playlist
+from pytuber.core.models import PlaylistIndex
+from pytuber.core.models import PlaylistItem
+from pytuber.core.models import PlaylistManager
+from pytuber.core.models import Provider
+from pytuber.core.models import Track
+from pytuber.core.models import TrackManager
+from pytuber.storage import Registry
+from pytuber.utils import init_registry
+from pytuber.utils import timestamp
+
+if TYPE_CHECKING:  # pragma: no cover
+    from pytuber.core.services import YouService
+    from pytuber.lastfm.services import LastService
+
+
+class PlaylistSync(NamedTuple):
+    playlist: Playlist
+    added: List[str]
+    removed: List[str]
+    failed: List[Tuple[str, Exception]]
+    error: Optional[Exception] = None
+
+
+class Session:
+    """
+    Run the pytuber operations from python without the cli, eg in a long
+    lived worker. The operations yield their results as they complete and
+    never write to the terminal.
+
+    The registry is a process wide singleton, every session of a process
+    shares the same storage. Call :meth:`close` or use the session as a
+    context manager to save the changes.
+
+    :param str path: The storage file, defaults to the cli storage
+    :raises ValueError: if the registry is attached to another storage
+    """
+
+    filename = "storage.db"
+
+    def __init__(self, path: Optional[str] = None):
+        appdir = click.get_app_dir("pytuber", False)
+        if path is None:
+            os.makedirs(appdir, exist_ok=True)
+            path = os.path.join(appdir, self.filename)
+
+        database = Registry().database
+        if database and os.path.abspath(database.path) != os.path.abspath(path):
+            raise ValueError(f"The registry is already attached to {database.path}")
+
+        self.path = path
+        init_registry(path, __version__)
+
+    @classmethod
+    def current(cls) -> "Session":
+        """Return the session of the running command or a new one."""
+        ctx = click.get_current_context(silent=True)
+        if ctx is None:
+            return cls()
+        return ctx.ensure_object(cls)
+
+    def __enter__(self) -> "Session":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def youtube(self) -> Type["YouService"]:
+        from pytuber.core.services import YouService
+
+        return YouService
+
+    @property
+    def lastfm(self) -> Type["LastService"]:
+        from pytuber.lastfm.services import LastService
+
+        return LastService
+
+    def close(self):
+        """
+        Save the changes, the access token and the completion index, the
+        expired search results are removed first.
+        """
+        # The youtube service is only loaded by the operations that use it
+        services = sys.modules.get("pytuber.core.services")
+        if services:
+            services.YouService.save_token()
+            services.YouService.sweep_searches()
+
+        Registry.persist(self.path)
+        if PlaylistManager.namespace in Registry.modified():
+            index = os.path.join(os.path.dirname(self.path), PlaylistIndex.filename)
+            PlaylistIndex.write(index)
+
+    def playlists(self, **kwargs) -> List[Playlist]:
+        """Return the playlists matching the given field conditions."""
+        return PlaylistManager.find(**kwargs)
+
+    def create_playlist(
+        self, title: str, tracks: Iterable[Tuple[str, str]], type: str, arguments: Dict
+    ) -> Playlist:
+        """
+        Add or update a user playlist.
+
+        :param str title: The playlist title
+        :param tracks: The artist and name of the tracks
+        :param str type: The playlist type
+        :param dict arguments: The playlist arguments, they identify it
+        """
+        return PlaylistManager.set(
+            {
+                "type": type,
+                "title": title.strip(),
+                "arguments": arguments,
+                "provider": Provider.user,
+                "tracks": TrackManager.set_many(
+                    {"artist": artist, "name": name} for artist, name in tracks
+                ),
+            }
+        )
+
+    def fetch_playlists(self) -> Iterator[Playlist]:
+        """
+        Import the youtube playlists created by pytuber, the items of the
+        unknown ones are imported as their tracks.
+        """
+        for playlist in self.youtube.get_playlists():
+            if not PlaylistManager.exists(playlist):
+                items = self.youtube.get_playlist_items(playlist)
+                playlist.tracks = TrackManager.set_many(
+                    {
+                        "artist": item.artist,
+                        "name": item.name,
+                        "youtube_id": item.video_id,
+                    }
+                    for item in items
+                )
+            yield PlaylistManager.set(playlist.asdict())
+
+    def fetch_tracks(
+        self, jobs: int = 1, retry: bool = False, tracks: Optional[List[Track]] = None
+    ) -> Iterator[Tuple[Track, Optional[str]]]:
+        """
+        Match the unmatched tracks to youtube videos within the daily quota
+        and yield them with their video ids.
+
+        :param int jobs: The number of concurrent searches
+        :param bool retry: Retry the tracks that are backing off
+        :param tracks: The tracks to match, defaults to the unmatched ones
+        """
+        if tracks is None:
+            tracks = TrackManager.find_unmatched(retry=retry)
+
+        results = self.youtube.search_tracks(tracks, jobs=jobs, refresh=retry)
+        for track, youtube_id in results:
+            yield TrackManager.set_youtube_id(track, youtube_id), youtube_id
+
+    def fetch_lastfm_tracks(self, *ids: str) -> Iterator[Tuple[Playlist, List[str]]]:
+        """
+        Update the track lists of the last.fm playlists, all of them or only
+        the given ids, and yield them with their track ids.
+        """
+        kwargs: Dict[str, Any] = {"provider": Provider.lastfm}
+        if ids:
+            kwargs["id"] = lambda x: x in ids
+
+        for playlist in PlaylistManager.find(**kwargs):
+            tracklist = self.lastfm.get_tracks(type=playlist.type, **playlist.arguments)
+            track_ids = list(
+                dict.fromkeys(
+                    TrackManager.set_many(
+                        {"artist": entry.artist.name, "name": entry.name}
+                        for entry in tracklist
+                    )
+                )
+            )
+            yield PlaylistManager.update(playlist, {"tracks": track_ids}), track_ids
+
+    def push_playlists(self) -> Iterator[Playlist]:
+        """Create the new playlists on youtube and yield them."""
+        for playlist in PlaylistManager.find(youtube_id=None):
+            youtube_id = self.youtube.create_playlist(playlist)
+            yield PlaylistManager.update(playlist, {"youtube_id": youtube_id})
+
+    def push_tracks(self) -> Iterator[PlaylistSync]:
+        """
+        Add the matched tracks missing from the youtube playlists, remove
+        the items that are no longer in the playlists and yield the changes
+        of every playlist. A playlist that fails to sync is yielded with its
+        error and the next ones are still synced.
+        """
+        online_playlists = PlaylistManager.find(youtube_id=lambda x: x is not None)
+        for playlist in online_playlists:
+            added: List[str] = []
+            removed: List[str] = []
+            failed: List[Tuple[str, Exception]] = []
+            error = None
+            try:
+                items = self.youtube.get_playlist_items(playlist)
+                add, remove = self.playlist_changes(playlist, items)
+
+                results = self.youtube.create_playlist_items(
+                    playlist, add, position=len(items)
+                )
+                added, failed = self.split_errors(add, results)
+
+                results = self.youtube.remove_playlist_items(remove)
+                removed, errors = self.split_errors(
+                    [item.video_id for item in remove], results
+                )
+                failed.extend(errors)
+            except Exception as e:
+                error = e
+
+            if added or removed:
+                playlist = PlaylistManager.update(playlist, {"uploaded": timestamp()})
+
+            yield PlaylistSync(playlist, added, removed, failed, error)
+
+    @staticmethod
+    def playlist_changes(
+        playlist: Playlist, items: List[PlaylistItem]
+    ) -> Tuple[List[str], List[PlaylistItem]]:
+        """
+        Return the matched videos missing from the online playlist items and
+        the items that are no longer in the playlist.
+        """
+        online = {item.video_id for item in items}
+        offline = {
+            track.youtube_id
+            for track in TrackManager.get_many(playlist.tracks)
+            if track.youtube_id is not None
+        }
+        add = sorted(offline - online)
+        remove = sorted(item for item in items if item.video_id not in offline)
+        return add, remove
+
+    @staticmethod
+    def split_errors(
+        video_ids: List[str], results: List
+    ) -> Tuple[List[str], List[Tuple[str, Exception]]]:
+        """Split the batch results to the succeeded and the failed videos."""
+        succeeded = []
+        failed = []
+        for video_id, result in zip(video_ids, results):
+            if isinstance(result, Exception):
+                failed.append((video_id, result))
+            else:
+                succeeded.append(video_id)
+        return succeeded, failed
@@ -1,18 +1,76 @@
+import importlib
 import os
+import sys
+from typing import Dict
+from typing import List
+from typing import Optional
 
 import click
-import click_completion
 
 from pytuber import __version__
-from pytuber.core import commands as core
-from pytuber.lastfm import commands as lastfm
-from pytuber.storage import Registry
-from pytuber.utils import init_registry
+from pytuber.api import Session
+from pytuber.daemon import Daemon
 
-click_completion.init(complete_options=True)
+if os.environ.get("_PYTUBER_COMPLETE"):
+    import click_completion
 
+    click_completion.init(complete_options=True)
 
-@click.group()
+
+class LazyGroup(click.Group):
+    """
+    Click group that imports its subcommands only when they are resolved,
+    the command modules and their service dependencies are only loaded for
+    the command that is actually invoked.
+
+    :param lazy_commands: The command names to their ``module:attribute``
+    """
+
+    def __init__(self, *args, lazy_commands: Optional[Dict[str, str]] = None, **kw):
+        super().__init__(*args, **kw)
+        self.lazy_commands = lazy_commands or {}
+
+    def list_commands(self, ctx: click.Context) -> List[str]:
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx: click.Context, name: str) -> Optional[click.Command]:
+        if name not in self.commands and name in self.lazy_commands:
+            module, attr = self.lazy_commands[name].split(":")
+            self.add_command(getattr(importlib.import_module(module), attr), name)
+        return super().get_command(ctx, name)
+
+
+class DaemonGroup(LazyGroup):
+    """
+    Root command group that forwards the command line to the daemon when it
+    is running and runs it in process otherwise.
+    """
+
+    def main(self, args=None, **kwargs):
+        if args is None:
+            args = sys.argv[1:]
+
+        if Daemon.forwards(args):
+            code = Daemon.forward(args)
+            if code is not None:
+                sys.exit(code)
+
+        return super().main(args, **kwargs)
+
+
+@click.group(
+    cls=DaemonGroup,
+    lazy_commands={
+        "batch": "pytuber.core.commands.cmd_batch:batch",
+        "daemon": "pytuber.core.commands.cmd_daemon:daemon",
+        "list": "pytuber.core.commands.cmd_list:list",
+        "show": "pytuber.core.commands.cmd_show:show",
+        "remove": "pytuber.core.commands.cmd_remove:remove",
+        "clean": "pytuber.core.commands.cmd_clean:clean",
+        "quota": "pytuber.core.commands.cmd_quota:quota",
+        "plan": "pytuber.core.commands.cmd_plan:plan",
+    },
+)
 @click.version_option(version=__version__)
 @click.pass_context
 def cli(ctx: click.Context):
@@ -21,54 +79,52 @@ def cli(ctx: click.Context):
     if not os.path.exists(appdir):
         print("Application Directory not found! Creating one at", appdir)
         os.makedirs(appdir)
-    cfg = os.path.join(appdir, "storage.db")
-    init_registry(cfg, __version__)
-
-    ctx.call_on_close(lambda: Registry.persist(cfg))
-
-
-cli.add_command(core.list)
-cli.add_command(core.show)
-cli.add_command(core.remove)
-cli.add_command(core.clean)
-cli.add_command(core.quota)
-
-
-@cli.group()
+    session = ctx.obj = Session(os.path.join(appdir, Session.filename))
+    ctx.call_on_close(session.close)
+
+
+@cli.group(
+    cls=LazyGroup,
+    lazy_commands={
+        "lastfm": "pytuber.lastfm.commands.cmd_setup:setup",
+        "youtube": "pytuber.core.commands.cmd_setup:setup",
+        "autocomplete": "pytuber.core.commands.cmd_autocomplete:autocomplete",
+    },
+)
 def setup():
     """Configure api keys and credentials."""
 
 
-setup.add_command(lastfm.setup)
-setup.add_command(core.setup)
-setup.add_command(core.autocomplete)
-
-
-@cli.group()
+@cli.group(
+    cls=LazyGroup,
+    lazy_commands={
+        "editor": "pytuber.core.commands.cmd_add:add_from_editor",
+        "file": "pytuber.core.commands.cmd_add:add_from_file",
+        "lastfm": "pytuber.lastfm.commands.cmd_add:add",
+    },
+)
 def add():
     """Add playlist."""
 
 
-add.add_command(core.add_from_editor)
-add.add_command(core.add_from_file)
-add.add_command(lastfm.add)
-
-
-@cli.group()
+@cli.group(
+    cls=LazyGroup,
+    lazy_commands={
+        "lastfm": "pytuber.lastfm.commands.cmd_fetch:fetch",
+        "youtube": "pytuber.core.commands.cmd_fetch:fetch",
+    },
+)
 def fetch():
     """Retrieve playlist or track info."""
 
 
-fetch.add_command(lastfm.fetch)
-fetch.add_command(core.fetch)
-
-
-@cli.group()
+@cli.group(
+    cls=LazyGroup,
+    lazy_commands={"youtube": "pytuber.core.commands.cmd_push:push"},
+)
 def push():
     """Update playlists and tracks."""
 
 
-push.add_command(core.push)
-
 if __name__ == "__main__":
     cli()
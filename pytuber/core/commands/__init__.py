@@ -1,25 +0,0 @@
-from pytuber.core.commands.cmd_add import add_from_editor
-from pytuber.core.commands.cmd_add import add_from_file
-from pytuber.core.commands.cmd_autocomplete import autocomplete
-from pytuber.core.commands.cmd_clean import clean
-from pytuber.core.commands.cmd_fetch import fetch
-from pytuber.core.commands.cmd_list import list
-from pytuber.core.commands.cmd_push import push
-from pytuber.core.commands.cmd_quota import quota
-from pytuber.core.commands.cmd_remove import remove
-from pytuber.core.commands.cmd_setup import setup
-from pytuber.core.commands.cmd_show import show
-
-__all__ = [
-    "setup",
-    "fetch",
-    "push",
-    "list",
-    "remove",
-    "show",
-    "autocomplete",
-    "clean",
-    "quota",
-    "add_from_editor",
-    "add_from_file",
-]
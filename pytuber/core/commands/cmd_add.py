@@ -2,16 +2,22 @@ import contextlib
 import io
 import json
 from functools import partial
+from functools import wraps
+from typing import Callable
+from typing import Dict
+from typing import IO
+from typing import Iterable
+from typing import Iterator
 from typing import List
+from typing import Set
+from typing import Tuple
 
 import click
-from lxml import etree
 from tabulate import tabulate
 
-from pytuber.core.models import PlaylistManager
+from pytuber.api import Session
 from pytuber.core.models import PlaylistType
-from pytuber.core.models import Provider
-from pytuber.core.models import TrackManager
+from pytuber.core.models import Track
 from pytuber.utils import magenta
 
 option_title = partial(
@@ -31,7 +37,7 @@ def add_from_editor(title: str) -> None:
     text = click.edit(marker)
     create_playlist(
         title=title,
-        tracks=parse_text(text or ""),
+        tracks=parse_text(io.StringIO(text or "")),
         type=PlaylistType.EDITOR,
         arguments={"_title": title.strip()},
     )
@@ -48,34 +54,67 @@ def add_from_editor(title: str) -> None:
 def add_from_file(file: str, title: str, format: str) -> None:
     """Import a playlist from a text file."""
 
-    with open(file, encoding="UTF-8") as fp:
-        text = fp.read()
-
-    parsers = {
+    parsers: Dict[str, Callable[[IO], List[tuple]]] = {
         "m3u": parse_m3u,
         "jspf": parse_jspf,
         "xspf": parse_xspf,
         "txt": parse_text,
     }
+    # The xml parser reads the encoding from the document declaration
+    mode, encoding = ("rb", None) if format == "xspf" else ("r", "UTF-8")
+    with open(file, mode, encoding=encoding) as fp:
+        tracks = parsers[format](fp)
+
     create_playlist(
         title=title,
-        tracks=parsers[format](text or ""),
+        tracks=tracks,
         type=PlaylistType.FILE,
         arguments={"_file": file},
     )
 
 
-def parse_text(text):
+def unique_tracks(
+    tracks: Iterable[Tuple[str, str]], normalize: bool = True
+) -> List[tuple]:
+    """
+    Remove the duplicate tracks and keep the first occurrence of each.
+
+    :param tracks: The artist and name of the tracks
+    :param bool normalize: Ignore case, spaces and punctuation, like the
+        track ids do, otherwise only exact duplicates are removed
+    :return: A list of tracks
+    """
+    seen: Set = set()
+    result: List[tuple] = []
+    for artist, name in tracks:
+        key = Track.slug(artist, name) if normalize else (artist, name)
+        if key not in seen:
+            seen.add(key)
+            result.append((artist, name))
+    return result
+
+
+def deduplicate(func: Callable[..., Iterator[Tuple[str, str]]]):
+    """Collect the tracks of a parser generator through `unique_tracks`."""
+
+    @wraps(func)
+    def wrapper(*args, **kwargs) -> List[tuple]:
+        return unique_tracks(func(*args, **kwargs))
+
+    return wrapper
+
+
+@deduplicate
+def parse_text(fp: IO[str]) -> Iterator[Tuple[str, str]]:
     """
     Parse raw text format playlists, each line must contain a single.
 
     track with artist and title separated by a single dash. eg Queen - Bohemian Rhapsody
 
-    :param str text:
+    :param fp: The text stream, read line by line
     :return: A list of tracks
     """
-    tracks: List[tuple] = []
-    for line in text.split("\n"):
+    for line in fp:
         line = line.strip()
         if not line or line.startswith("#"):
             continue
@@ -85,66 +124,62 @@ def parse_text(text):
             continue
 
         artist, track = list(map(str.strip, parts))
-        if not artist or not track or (artist, track) in tracks:
-            continue
+        if artist and track:
+            yield artist, track
 
-        tracks.append((artist, track))
 
-    return tracks
-
-
-def parse_xspf(text):
+@deduplicate
+def parse_xspf(fp: IO[bytes]) -> Iterator[Tuple[str, str]]:
     """
-    XSPF parser.
+    XSPF parser, the track elements are released as soon as they are read
+    to keep the memory usage flat on large documents.
 
-    :param str text:
+    :param fp: The binary stream of the document
     :return: A list of tracks
     """
-    tracks = []
+    from lxml import etree
+
     with contextlib.suppress(etree.XMLSyntaxError):
-        context = etree.iterparse(io.BytesIO(text.encode("UTF-8")))
-        for _, elem in context:
-            if elem.tag.endswith("creator"):
-                artist = elem.text.strip()
-            elif elem.tag.endswith("title"):
-                track = elem.text.strip()
-            elif elem.tag.endswith("track"):
-                if artist and track and (artist, track) not in tracks:
-                    tracks.append((artist, track))
-                artist = track = None
-    return tracks
-
-
-def parse_jspf(text):
+        for _, elem in etree.iterparse(fp, events=("end",), tag="{*}track"):
+            artist = (elem.findtext("{*}creator") or "").strip()
+            track = (elem.findtext("{*}title") or "").strip()
+
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+            if artist and track:
+                yield artist, track
+
+
+@deduplicate
+def parse_jspf(fp: IO[str]) -> Iterator[Tuple[str, str]]:
     """
     JSPF parser.
 
-    :param str text:
+    :param fp: The text stream of the document
     :return: A list of tracks
     """
 
-    tracks = []
     with contextlib.suppress(KeyError, json.JSONDecodeError):
-        data = json.loads(text)
+        data = json.load(fp)
         for item in data["playlist"]["track"]:
             artist = item.get("creator", "").strip()
             track = item.get("title", "").strip()
-            if artist and track and (artist, track) not in tracks:
-                tracks.append((artist, track))
-
-    return tracks
+            if artist and track:
+                yield artist, track
 
 
-def parse_m3u(text):
+@deduplicate
+def parse_m3u(fp: IO[str]) -> Iterator[Tuple[str, str]]:
     """
     M3U parser.
 
-    :param str text:
+    :param fp: The text stream, read line by line
     :return: A list of tracks
     """
 
-    tracks: List[tuple] = []
-    for line in text.split("\n"):
+    for line in fp:
         line = line.strip()
         if not line.startswith("#EXTINF:"):
             continue
@@ -158,12 +193,8 @@ def parse_m3u(text):
             continue
 
         artist, track = list(map(str.strip, parts))
-        if not artist or not track or (artist, track) in tracks:
-            continue
-
-        tracks.append((artist, track))
-
-    return tracks
+        if artist and track:
+            yield artist, track
 
 
 def create_playlist(title, tracks, type, arguments):
@@ -188,16 +219,6 @@ def create_playlist(title, tracks, type, arguments):
         )
     )
     click.confirm("Are you sure you want to save this playlist?", abort=True)
-    playlist = PlaylistManager.set(
-        {
-            "type": type,
-            "title": title.strip(),
-            "arguments": arguments,
-            "provider": Provider.user,
-            "tracks": [
-                TrackManager.set({"artist": artist, "name": name}).id
-                for artist, name in tracks
-            ],
-        }
-    )
+    session = Session.current()
+    playlist = session.create_playlist(title, tracks, type, arguments)
     click.secho(f"Added playlist: {playlist.id}!")
@@ -0,0 +1,85 @@
+import shlex
+import time
+from typing import IO
+from typing import List
+
+import click
+
+from pytuber.storage import Registry
+from pytuber.utils import magenta
+
+
+@click.command()
+@click.argument("script", type=click.File("r"), default="-")
+@click.option("--fail-fast", is_flag=True, help="Stop at the first failing step")
+@click.pass_context
+def batch(ctx: click.Context, script: IO, fail_fast: bool):
+    """
+    Run a script of pytuber commands in a single process.
+
+    Every line of the script, or the standard input, is a command line
+    with or without the program name, empty lines and comments are
+    skipped. The registry is loaded once and the changes of all the steps
+    are saved together at the end.
+    """
+
+    root = ctx.find_root()
+    steps = parse_script(script)
+    ran = failed = 0
+    start = time.perf_counter()
+    with Registry.transaction():
+        for num, args in enumerate(steps, start=1):
+            step_start = time.perf_counter()
+            code = run_step(root, args)
+            ran += 1
+            command = " ".join(shlex.quote(arg) for arg in args)
+            elapsed = time.perf_counter() - step_start
+            status = "ok" if code == 0 else f"failed with exit code {code}"
+            click.secho(
+                f"{magenta(f'[{num}/{len(steps)}]')} {command}: {status} "
+                f"in {elapsed:.2f}s"
+            )
+            if code != 0:
+                failed += 1
+                if fail_fast:
+                    break
+
+    elapsed = time.perf_counter() - start
+    click.secho(f"Ran {ran} steps in {elapsed:.2f}s, {failed} failed")
+    if failed:
+        ctx.exit(1)
+
+
+def parse_script(script: IO) -> List[List[str]]:
+    steps = []
+    for line in script:
+        args = shlex.split(line, comments=True)
+        if args and args[0] == "pytuber":
+            args = args[1:]
+        if args:
+            steps.append(args)
+    return steps
+
+
+def run_step(root: click.Context, args: List[str]) -> int:
+    """Run a subcommand of the root command and return its exit code."""
+    try:
+        name, command, rest = root.command.resolve_command(root, args)  # type: ignore
+        if name in ("batch", "daemon"):
+            raise click.UsageError(f"The {name} command can't run in a batch")
+
+        code = command.main(  # type: ignore
+            rest, prog_name=f"{root.info_name} {name}", standalone_mode=False
+        )
+        return code if isinstance(code, int) else 0
+    except click.ClickException as e:
+        e.show()
+        return e.exit_code
+    except click.Abort:
+        click.secho("Aborted!", err=True)
+        return 1
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else 1
+    except Exception as e:
+        click.secho(f"{type(e).__name__}: {e}", err=True)
+        return 1
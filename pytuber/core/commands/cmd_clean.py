@@ -2,7 +2,7 @@ import click
 from tabulate import tabulate
 
 from pytuber.core.models import PlaylistManager
-from pytuber.core.models import TrackManager
+from pytuber.core.models import References
 from pytuber.utils import magenta
 
 
@@ -10,22 +10,13 @@ from pytuber.utils import magenta
 def clean():
     """Cleanup orphan tracks and empty playlists."""
 
-    tracks = []
     removed_playlists = 0
     for playlist in PlaylistManager.find():
-
         if len(playlist.tracks) == 0:
             PlaylistManager.remove(playlist.id)
             removed_playlists += 1
-        else:
-            tracks += playlist.tracks
 
-    tracks = list(set(tracks))
-    removed_tracks = 0
-    for track in TrackManager.find():
-        if track.id not in tracks:
-            TrackManager.remove(track.id)
-            removed_tracks += 1
+    removed_tracks = References.collect()
 
     click.secho("Cleanup removed:", bold=True)
     click.secho(
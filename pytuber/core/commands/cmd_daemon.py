@@ -0,0 +1,32 @@
+import contextlib
+
+import click
+
+from pytuber.daemon import Daemon
+
+
+@click.command()
+@click.option("--stop", is_flag=True, help="Stop the running daemon")
+@click.pass_context
+def daemon(ctx: click.Context, stop: bool):
+    """
+    Serve the other pytuber commands from this process.
+
+    While the daemon is running the commands are forwarded to it over a
+    unix socket and reuse its warm registry and api clients, otherwise
+    they run in their own process.
+    """
+
+    if not Daemon.supported():
+        raise click.UsageError("The daemon requires unix socket support")
+
+    if stop:
+        if Daemon.stop():
+            click.secho("Daemon stopped")
+        else:
+            click.secho("No daemon is running")
+        return
+
+    click.secho(f"Listening on {Daemon.path()}")
+    with contextlib.suppress(KeyboardInterrupt):
+        Daemon.serve(ctx.find_root().command)
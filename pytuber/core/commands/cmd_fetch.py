@@ -1,8 +1,9 @@
 import click
+from tabulate import tabulate
 
-from pytuber.core.models import PlaylistManager
+from pytuber.api import Session
 from pytuber.core.models import TrackManager
-from pytuber.core.services import YouService
+from pytuber.utils import date
 from pytuber.utils import magenta
 from pytuber.utils import spinner
 
@@ -11,58 +12,84 @@ from pytuber.utils import spinner
 @click.option("--all", is_flag=True, help="Perform all tasks")
 @click.option("--playlists", is_flag=True, help="Create new playlists")
 @click.option("--tracks", is_flag=True, help="Update playlist items")
+@click.option(
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of concurrent track searches",
+)
+@click.option("--retry", is_flag=True, help="Retry unmatched tracks without waiting")
+@click.option("--unmatched", is_flag=True, help="List the unmatched tracks")
 @click.pass_context
 def fetch(
     ctx: click.Context,
     tracks: bool = False,
     playlists: bool = False,
     all: bool = False,
+    jobs: int = 1,
+    retry: bool = False,
+    unmatched: bool = False,
 ):
     """Fetch youtube online playlist and tracks data."""
 
-    if not all and not playlists and not tracks:
+    if not all and not playlists and not tracks and not unmatched:
         click.secho(ctx.get_help())
         click.Abort()
 
     if all or playlists:
         fetch_playlists()
     if all or tracks:
-        fetch_tracks()
+        fetch_tracks(jobs, retry)
+    if unmatched:
+        list_unmatched()
 
 
 def fetch_playlists():
+    session = Session.current()
+    total = 0
     with spinner("Fetching playlists info") as sp:
-        playlists = YouService.get_playlists()
-        for playlist in playlists:
-            if not PlaylistManager.exists(playlist):
-                items = YouService.get_playlist_items(playlist)
-                track_ids = [
-                    TrackManager.set(
-                        {
-                            "artist": item.artist,
-                            "name": item.name,
-                            "youtube_id": item.video_id,
-                        }
-                    ).id
-                    for item in items
-                ]
-                playlist.tracks = track_ids
-            PlaylistManager.set(playlist.asdict())
+        for _ in session.fetch_playlists():
+            total += 1
 
-        total = len(playlists)
         if total > 0:
             sp.text = f"Fetched {magenta(total)} playlist(s) info"
 
 
-def fetch_tracks():
-    tracks = TrackManager.find(youtube_id=None)
+def fetch_tracks(jobs: int = 1, retry: bool = False):
+    session = Session.current()
+    tracks = TrackManager.find_unmatched(retry=retry)
     message = "Matching tracks to videos"
+    matched = 0
     with spinner(message) as sp:
-        for track in tracks:
+        for track, _ in session.fetch_tracks(jobs=jobs, retry=retry, tracks=tracks):
             sp.text = f"{message}: {track.artist} - {track.name}"
-            youtube_id = YouService.search_track(track)
-            TrackManager.update(track, {"youtube_id": youtube_id})
+            matched += 1
 
         total = len(tracks)
-        if total > 0:
-            sp.text = f"Matched {magenta(total)} tracks to videos"
+        if matched < total:
+            sp.write(f"Quota limit reached, {total - matched} tracks left unmatched")
+        if matched > 0:
+            sp.text = f"Matched {magenta(matched)} tracks to videos"
+
+
+def list_unmatched():
+    tracks = TrackManager.find(youtube_id=None)
+    if len(tracks) == 0:
+        click.secho("No unmatched tracks found")
+    else:
+        click.secho(
+            tabulate(  # type: ignore
+                [
+                    (
+                        track.id,
+                        track.artist,
+                        track.name,
+                        track.attempts,
+                        date(track.attempted),
+                        date(TrackManager.next_attempt(track)),
+                    )
+                    for track in tracks
+                ],
+                headers=("ID", "Artist", "Name", "Attempts", "Last", "Next"),
+            )
+        )
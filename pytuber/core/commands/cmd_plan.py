@@ -0,0 +1,57 @@
+import click
+from tabulate import tabulate
+
+from pytuber.core.planner import Planner
+from pytuber.core.services import YouService
+from pytuber.utils import date
+from pytuber.utils import magenta
+from pytuber.utils import spinner
+
+
+@click.command()
+@click.option("--run", is_flag=True, help="Run the work that fits in today's quota")
+def plan(run: bool):
+    """
+    Plan the pending youtube work within the daily quota.
+
+    New playlists are created first, then tracks are matched to videos and
+    finally playlist items are pushed. The work that doesn't fit in the
+    remaining quota is deferred until the next quota reset.
+    """
+
+    tasks = Planner.tasks()
+    if len(tasks) == 0:
+        click.secho("No pending youtube work")
+        return
+
+    if not run:
+        due, waiting = Planner.pending(tasks)
+        budget = YouService.get_quota_budget()
+        today, deferred = Planner.plan(due, budget.limit - budget.usage)
+        resume = date(YouService.quota_reset())
+        rows = [(task, "today") for task in today]
+        rows.extend((task, resume) for task in deferred)
+        rows.extend((task, date(task.resume)) for task in waiting)
+        click.secho(
+            tabulate(  # type: ignore
+                [
+                    (task.type, task.key, task.title, task.cost, when)
+                    for task, when in rows
+                ],
+                headers=("Task", "ID", "Title", "Cost", "When"),
+            )
+        )
+        return
+
+    message = "Running youtube tasks"
+    with spinner(message) as sp:
+        completed = 0
+        for task, done in Planner.run(tasks):
+            sp.text = f"{message}: {task.type} {task.title}"
+            completed += done
+
+        sp.text = f"Completed {magenta(completed)} youtube tasks"
+        deferred = Planner.schedule()
+        if deferred:
+            resume = date(deferred[0].resume)
+            sp.write(f"Deferred {len(deferred)} tasks until {resume}")
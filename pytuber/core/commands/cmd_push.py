@@ -1,10 +1,7 @@
 import click
 
-from pytuber.core.models import PlaylistManager
-from pytuber.core.models import TrackManager
-from pytuber.core.services import YouService
+from pytuber.api import Session
 from pytuber.utils import spinner
-from pytuber.utils import timestamp
 
 
 @click.command("youtube")
@@ -31,56 +28,28 @@ def push(
 
 
 def push_playlists():
-    playlists = PlaylistManager.find(youtube_id=None)
+    session = Session.current()
     message = "Creating playlists"
+    total = 0
     with spinner(message) as sp:
-        for playlist in playlists:
+        for playlist in session.push_playlists():
             sp.text = f"{message}: {playlist.title}"
-            youtube_id = YouService.create_playlist(playlist)
-            PlaylistManager.update(playlist, {"youtube_id": youtube_id})
+            total += 1
 
-        total = len(playlists)
         if total > 0:
             sp.text = "{0}: {1}/{1} ".format(message, total)
 
 
 def push_tracks():
-    online_playlists = PlaylistManager.find(youtube_id=lambda x: x is not None)
+    session = Session.current()
     click.secho("Syncing playlists", bold=True)
-    for playlist in online_playlists:
-        add = items = remove = []
-        with spinner(f"Fetching playlist items: {playlist.title}"):
-            items = YouService.get_playlist_items(playlist)
-            online = {item.video_id for item in items}
-            offline = {
-                track.youtube_id
-                for track in TrackManager.find(
-                    youtube_id=lambda x: x is not None,
-                    id=lambda x: x in playlist.tracks,
-                )
-            }
-
-            add = offline - online
-            remove = online - offline
-
-        message = "Adding new playlist items"
-        with spinner(message) as sp:
-            for video_id in sorted(add):
-                sp.text = f"{message}: {video_id}"
-                YouService.create_playlist_item(playlist, video_id)
-
-            if len(add) > 0:
-                sp.text = f"{message}: {len(add)}"
-
-        message = "Removing playlist items"
-        with spinner(message) as sp:
-            remove = [item for item in items if item.video_id in remove]
-            for item in sorted(remove):
-                sp.text = f"{message}: {video_id}"
-                YouService.remove_playlist_item(item)
-
-            if len(remove) > 0:
-                sp.text = f"{message}: {len(remove)}"
-
-        if len(add) or len(remove):
-            PlaylistManager.update(playlist, {"uploaded": timestamp()})
+    with spinner("Syncing playlist items") as sp:
+        for sync in session.push_tracks():
+            for video_id, error in sync.failed:
+                sp.write(f"Failed: {video_id} - {error}")
+            if sync.error:
+                sp.write(f"Failed: {sync.playlist.title} - {sync.error}")
+            sp.write(
+                f"Playlist: {sync.playlist.title} - {len(sync.added)} added, "
+                f"{len(sync.removed)} removed"
+            )
@@ -8,10 +8,15 @@ from pytuber.core.models import PlaylistManager
 
 @click.command()
 @click.argument("ids", type=params.PlaylistParamType(), required=True, nargs=-1)
-def remove(ids: Tuple[str]):
+@click.option(
+    "--auto-gc",
+    is_flag=True,
+    help="Remove the tracks that are no longer used by any playlist",
+)
+def remove(ids: Tuple[str], auto_gc: bool = False):
     """Delete one or more playlists by id."""
 
     click.confirm("Do you want to continue?", abort=True)
     for id in ids:
-        PlaylistManager.remove(id)
+        PlaylistManager.remove(id, gc=auto_gc)
         click.secho(f"Removed playlist: {id}!")
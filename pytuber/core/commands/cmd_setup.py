@@ -1,8 +1,11 @@
+from contextlib import suppress
+
 import click
 
 from pytuber.core.models import ConfigManager
 from pytuber.core.models import Provider
 from pytuber.core.services import YouService
+from pytuber.storage import Registry
 
 
 @click.command("youtube")
@@ -15,7 +18,14 @@ from pytuber.core.services import YouService
     default=1000000,
     help="Override default youtube quota limit",
 )
-def setup(client_secrets: str, quota_limit: int) -> None:
+@click.option(
+    "--search-ttl",
+    type=click.IntRange(min=0),
+    required=False,
+    default=YouService.search_ttl,
+    help="Days to cache youtube search results",
+)
+def setup(client_secrets: str, quota_limit: int, search_ttl: int) -> None:
     """
     Configure your youtube api credentials.
 
@@ -39,7 +49,14 @@ def setup(client_secrets: str, quota_limit: int) -> None:
                 "client_secret": credentials.client_secret,
                 "scopes": credentials.scopes,
                 "quota_limit": quota_limit,
+                "search_ttl": search_ttl,
             },
         }
     )
+
+    # The access token of the previous credentials must not be reused
+    with suppress(KeyError):
+        Registry.remove(YouService.token_key)
+    YouService.reset_credentials(credentials)
+    YouService.save_token()
     click.secho("Youtube configuration updated!")
@@ -60,7 +60,7 @@ def show(id: Optional[str], mime: bool = False):
                 t.name,
                 click.style("✔", fg="green") if t.youtube_id else "-",
             )
-            for t in [TrackManager.get(id) for id in playlist.tracks]
+            for t in TrackManager.get_many(playlist.tracks)
         ],
         showindex="always",
         headers=("No", "Artist", "Track Name", "Youtube"),
@@ -1,17 +1,23 @@
 import base64
+import bisect
 import contextlib
 import enum
 import hashlib
+import itertools
 import json
+import os
 import re
 from dataclasses import asdict
 from dataclasses import dataclass
 from dataclasses import field
 from dataclasses import fields
 from dataclasses import replace
+from datetime import timedelta
 from typing import Dict
+from typing import Iterable
 from typing import List
 from typing import Optional
+from typing import Tuple
 from typing import Type
 
 from pytuber.exceptions import NotFound
@@ -55,17 +61,20 @@ class Track(Document):
     name: str = field()
     id: Optional[str] = field(default=None)
     youtube_id: Optional[str] = field(default=None, metadata={"keep": True})
+    attempts: int = field(default=0, metadata={"keep": True})
+    attempted: Optional[int] = field(default=None, metadata={"keep": True})
 
     def __post_init__(self):
         if self.id is None:
             self.id = hashlib.sha1(
-                re.sub(
-                    r"[\W_]+",
-                    "",
-                    f"{self.artist}{self.name}".lower(),
-                ).encode("utf-8")
+                self.slug(self.artist, self.name).encode("utf-8")
             ).hexdigest()[:7]
 
+    @staticmethod
+    def slug(artist: str, name: str) -> str:
+        """Return the artist and name without case, spaces and punctuation."""
+        return re.sub(r"[\W_]+", "", f"{artist}{name}".lower())
+
 
 @dataclass
 class Playlist(Document):
@@ -132,6 +141,7 @@ class Manager:
     namespace: str
     model: Type
     key: str
+    indexes: Tuple[str, ...] = ()
 
     @classmethod
     def keys(cls):
@@ -152,6 +162,16 @@ class Manager:
 
         raise NotFound(f"No {cls.namespace} matched your argument: {key}!")
 
+    @classmethod
+    def get_many(cls, keys: Iterable) -> List:
+        """
+        Return the records for the given keys in a single pass, in the same
+        order, missing keys are skipped.
+        """
+        keys = [str(key) for key in keys]
+        records = Registry.get_many(cls.namespace, keys)
+        return [cls.model(**records[key]) for key in keys if key in records]
+
     @classmethod
     def set(cls, data: Dict):
         obj = cls.model(**data)
@@ -166,6 +186,32 @@ class Manager:
         Registry.set(cls.namespace, key, obj.asdict())
         return obj
 
+    @classmethod
+    def set_many(cls, items: Iterable[Dict]) -> List:
+        """
+        Create or update multiple records in a single storage transaction and
+        return their keys in the same order.
+
+        The stored records are read in one pass to merge the keep fields.
+        """
+        objs = [cls.model(**data) for data in items]
+        keys = [getattr(obj, cls.key) for obj in objs]
+        keep = [f.name for f in fields(cls.model) if f.metadata.get("keep")]
+        existing = Registry.get_many(cls.namespace, keys)
+
+        with Registry.transaction():
+            for key, obj in zip(keys, objs):
+                data = existing.get(key)
+                if data:
+                    for name in keep:
+                        if not getattr(obj, name):
+                            setattr(obj, name, data.get(name))
+
+                existing[key] = obj.asdict()
+                Registry.set(cls.namespace, key, existing[key])
+
+        return keys
+
     @classmethod
     def update(cls, obj, data: Dict):
         new = replace(obj, **data)
@@ -195,11 +241,44 @@ class Manager:
                 return True
             return False
 
-        return [
-            cls.model(**raw)
-            for raw in Registry.get(cls.namespace, default={}).values()
-            if match(raw, kwargs)
-        ]
+        keys = cls.search(**kwargs)
+        if keys is None:
+            records = Registry.get(cls.namespace, default={}).values()
+        else:
+            found = Registry.get_many(cls.namespace, keys)
+            records = (found[key] for key in keys if key in found)
+
+        return [cls.model(**raw) for raw in records if match(raw, kwargs)]
+
+    @classmethod
+    def search(cls, **kwargs) -> Optional[List[str]]:
+        """
+        Return the keys of the records that satisfy the equality and null
+        conditions on the key or the indexed fields, or None if no condition can
+        be answered without a full scan.
+        """
+        keys = None
+        for name, value in kwargs.items():
+            if value is not None and not isinstance(value, (str, StrEnum)):
+                continue
+
+            if name == cls.key and value is not None:
+                key = str(value)
+                found = [key] if Registry.exists(cls.namespace, key) else []
+            elif name in cls.indexes:
+                found = Registry.search(
+                    cls.namespace, name, None if value is None else str(value)
+                )
+            else:
+                continue
+
+            if keys is None:
+                keys = found
+            else:
+                matched = set(found)
+                keys = [key for key in keys if key in matched]
+
+        return keys
 
 
 class ConfigManager(Manager):
@@ -212,24 +291,268 @@ class PlaylistManager(Manager):
     namespace = "playlist"
     key = "id"
     model = Playlist
+    indexes = ("provider", "type", "youtube_id")
+
+    @classmethod
+    def set(cls, data: Dict):
+        previous = cls.tracks(cls.model(**data).id)
+        with Registry.transaction():
+            playlist = super().set(data)
+            References.update(playlist.id, previous, playlist.tracks)
+        return playlist
 
     @classmethod
     def update(cls, obj, data: Dict):
         if len(data.get("tracks", [])) > 0:
             data["synced"] = timestamp()
 
-        return super().update(obj, data)
+        previous = cls.tracks(obj.id)
+        with Registry.transaction():
+            playlist = super().update(obj, data)
+            References.update(playlist.id, previous, playlist.tracks)
+        return playlist
+
+    @classmethod
+    def remove(cls, key, gc: bool = False):
+        """
+        Remove a playlist and release its tracks, with garbage collection
+        enabled the tracks that are no longer referenced are removed as well.
+        """
+        previous = cls.tracks(key)
+        with Registry.transaction():
+            super().remove(key)
+            References.update(key, previous, [])
+            if gc:
+                References.collect(previous)
+
+    @classmethod
+    def tracks(cls, key) -> List[str]:
+        return Registry.get(cls.namespace, str(key), "tracks", default=[])
+
+
+class PlaylistIndex:
+    """
+    Sidecar file with the playlist ids and titles for the shell completion,
+    reading it is much cheaper than opening the storage and loading every
+    playlist on each key press.
+
+    The ids and every word suffix of the titles are kept sorted for prefix
+    lookups with binary search.
+    """
+
+    filename = "playlists.idx"
+
+    @classmethod
+    def write(cls, path: str):
+        playlists = Registry.get(PlaylistManager.namespace, default={})
+        titles = {key: playlists[key]["title"] for key in sorted(playlists)}
+        words = sorted(
+            [suffix, key]
+            for key, title in titles.items()
+            for suffix in cls.suffixes(title)
+        )
+
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as fp:
+            json.dump({"titles": titles, "words": words}, fp)
+        os.replace(tmp, path)
+
+    @classmethod
+    def read(cls, path: str) -> Optional[Dict]:
+        with contextlib.suppress(OSError, ValueError):
+            with open(path) as fp:
+                return json.load(fp)
+        return None
+
+    @classmethod
+    def complete(cls, index: Dict, incomplete: str) -> List[Tuple[str, str]]:
+        """
+        Return the playlist ids and titles, where the id or any word of the
+        title starts with the incomplete text.
+        """
+        prefix = incomplete.casefold()
+        titles = index["titles"]
+        keys = list(titles)
+        matches = []
+        start = bisect.bisect_left(keys, prefix)
+        for key in itertools.islice(keys, start, None):
+            if not key.startswith(prefix):
+                break
+            matches.append(key)
+
+        words = index["words"]
+        start = bisect.bisect_left(words, [prefix])
+        for word, key in itertools.islice(words, start, None):
+            if not word.startswith(prefix):
+                break
+            matches.append(key)
+
+        return [(key, titles[key]) for key in dict.fromkeys(matches)]
+
+    @staticmethod
+    def suffixes(title: str) -> List[str]:
+        words = title.casefold().split()
+        return [" ".join(words[i:]) for i in range(len(words))]
 
 
 class TrackManager(Manager):
     namespace = "track"
     key = "id"
     model = Track
+    indexes = ("youtube_id",)
+    backoff = timedelta(days=1)
+    max_backoff = timedelta(days=64)
+
+    @classmethod
+    def set(cls, data: Dict):
+        track = super().set(data)
+        References.register(track.id)
+        return track
+
+    @classmethod
+    def set_many(cls, items: Iterable[Dict]) -> List:
+        with Registry.transaction():
+            keys = super().set_many(items)
+            for key in keys:
+                References.register(key)
+        return keys
 
     @classmethod
     def find_youtube_id(cls, id: str):
         return Registry.get(cls.namespace, id, "youtube_id", default=None)
 
+    @classmethod
+    def find_unmatched(cls, retry: bool = False) -> List[Track]:
+        """
+        Return the tracks without a youtube video, the ones that failed to
+        match are skipped until their next attempt is due unless retry.
+        """
+        now = timestamp()
+        return [
+            track
+            for track in cls.find(youtube_id=None)
+            if retry or cls.next_attempt(track) <= now
+        ]
+
+    @classmethod
+    def next_attempt(cls, track: Track) -> int:
+        """
+        Return the timestamp of the next match attempt, the delay doubles
+        after every failed attempt up to `max_backoff`.
+        """
+        if not track.attempts or not track.attempted:
+            return 0
+
+        delay = min(cls.backoff * 2 ** (track.attempts - 1), cls.max_backoff)
+        return track.attempted + int(delay.total_seconds())
+
+    @classmethod
+    def set_youtube_id(cls, track: Track, youtube_id: Optional[str]) -> Track:
+        """Update the track match and record the failed attempts."""
+        if youtube_id:
+            data = {"youtube_id": youtube_id, "attempts": 0, "attempted": None}
+        else:
+            data = {"attempts": track.attempts + 1, "attempted": timestamp()}
+        return cls.update(track, data)
+
+
+class References:
+    """
+    Reverse index of the playlists that reference each track, tracks without
+    any references are kept in the orphans namespace until they are
+    collected.
+    """
+
+    namespace = "reference"
+    orphans = "orphan"
+
+    @classmethod
+    def get(cls, track_id: str) -> List[str]:
+        cls.ensure()
+        return Registry.get(cls.namespace, track_id, default=[])
+
+    @classmethod
+    def update(cls, playlist_id: str, previous: List[str], current: List[str]):
+        """Update the references of the tracks added or removed from a playlist."""
+        cls.ensure()
+        previous_ids, current_ids = set(previous), set(current)
+        added = [id for id in dict.fromkeys(current) if id not in previous_ids]
+        removed = [id for id in dict.fromkeys(previous) if id not in current_ids]
+        for track_id in added:
+            playlists = cls.get(track_id)
+            if playlist_id not in playlists:
+                Registry.set(cls.namespace, track_id, playlists + [playlist_id])
+            with contextlib.suppress(KeyError):
+                Registry.remove(cls.orphans, track_id)
+
+        for track_id in removed:
+            playlists = [id for id in cls.get(track_id) if id != playlist_id]
+            if playlists:
+                Registry.set(cls.namespace, track_id, playlists)
+            else:
+                with contextlib.suppress(KeyError):
+                    Registry.remove(cls.namespace, track_id)
+                cls.register(track_id)
+
+    @classmethod
+    def register(cls, track_id: str):
+        """Mark an existing track as orphan if no playlist references it."""
+        if (
+            not cls.get(track_id)
+            and not Registry.exists(cls.orphans, track_id)
+            and Registry.exists(TrackManager.namespace, track_id)
+        ):
+            Registry.set(cls.orphans, track_id, timestamp())
+
+    @classmethod
+    def collect(cls, track_ids: Optional[Iterable[str]] = None) -> int:
+        """
+        Remove the orphan tracks and return how many were removed, only the
+        given tracks are collected if any.
+        """
+        cls.ensure()
+        orphans = Registry.get(cls.orphans)
+        if track_ids is None:
+            track_ids = list(orphans.keys())
+        else:
+            track_ids = [id for id in dict.fromkeys(track_ids) if id in orphans]
+
+        total = 0
+        with Registry.transaction():
+            for track_id in track_ids:
+                Registry.remove(cls.orphans, track_id)
+                if not cls.get(track_id) and Registry.exists(
+                    TrackManager.namespace, track_id
+                ):
+                    TrackManager.remove(track_id)
+                    total += 1
+        return total
+
+    @classmethod
+    def ensure(cls):
+        if not Registry.exists(cls.namespace) or not Registry.exists(cls.orphans):
+            cls.rebuild()
+
+    @classmethod
+    def rebuild(cls):
+        """Build the index from scratch by scanning all playlists."""
+        references: Dict[str, List[str]] = {}
+        for playlist in Registry.get(PlaylistManager.namespace, default={}).values():
+            for track_id in playlist.get("tracks", []):
+                playlists = references.setdefault(track_id, [])
+                if playlist["id"] not in playlists:
+                    playlists.append(playlist["id"])
+
+        Registry.set(cls.namespace, references)
+        Registry.set(
+            cls.orphans,
+            {
+                track_id: timestamp()
+                for track_id in TrackManager.keys()
+                if track_id not in references
+            },
+        )
+
 
 class History:
     namespace = "history"
@@ -1,9 +1,8 @@
 import os
 
 import click
-from click_completion import completion_configuration
 
-from pytuber.core.models import PlaylistManager
+from pytuber.core.models import PlaylistIndex
 from pytuber.core.models import Provider
 from pytuber.storage import Registry
 
@@ -18,18 +17,21 @@ class PlaylistParamType(RegistryParamType):
     name = "ID"
 
     def complete(self, ctx, incomplete):
-        self.init_registry()
-        return [
-            k
-            for k in PlaylistManager.keys()
-            if completion_configuration.match_incomplete(k, incomplete)
-        ]
+        path = os.path.join(click.get_app_dir("pytuber", False), PlaylistIndex.filename)
+        index = PlaylistIndex.read(path)
+        if index is None:
+            self.init_registry()
+            PlaylistIndex.write(path)
+            index = PlaylistIndex.read(path)
+        return PlaylistIndex.complete(index, incomplete)
 
 
 class ProviderParamType(click.ParamType):
     name = "Provider"
 
     def complete(self, ctx, incomplete):
+        from click_completion import completion_configuration
+
         return [
             k.value
             for k in Provider
@@ -0,0 +1,281 @@
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from pytuber.api import Session
+from pytuber.core.models import Document
+from pytuber.core.models import Playlist
+from pytuber.core.models import PlaylistManager
+from pytuber.core.models import StrEnum
+from pytuber.core.models import TrackManager
+from pytuber.core.services import QuotaBudget
+from pytuber.core.services import YouService
+from pytuber.storage import NOTHING
+from pytuber.storage import Registry
+from pytuber.utils import timestamp
+
+
+class TaskType(StrEnum):
+    PLAYLIST = "playlist"
+    MATCH = "match"
+    SYNC = "sync"
+
+
+@dataclass(order=True)
+class Task(Document):
+    priority: int
+    type: str
+    key: str
+    cost: int = field(compare=False)
+    title: str = field(default="", compare=False)
+    resume: Optional[int] = field(default=None, compare=False)
+
+    def __post_init__(self):
+        self.type = str(self.type)
+
+    @property
+    def id(self):
+        return f"{self.type}:{self.key}"
+
+
+class Planner:
+    """
+    Schedule the pending youtube work within the daily quota. New playlists
+    come first, then track matches and finally the playlist items sync.
+
+    The work that doesn't fit in the remaining quota is deferred until the
+    next quota reset, it's stored in the schedule namespace and skipped
+    until then. After the reset the deferred work runs ahead of the new
+    work of the same priority.
+    """
+
+    namespace = "schedule"
+    priorities = {TaskType.PLAYLIST: 0, TaskType.MATCH: 1, TaskType.SYNC: 2}
+
+    @classmethod
+    def tasks(cls) -> List[Task]:
+        """Return the pending tasks by priority with their estimated cost."""
+        tasks = []
+        playlists = PlaylistManager.find()
+        for playlist in playlists:
+            if playlist.youtube_id is None:
+                tasks.append(
+                    cls.task(
+                        TaskType.PLAYLIST,
+                        playlist.id,
+                        YouService.create_playlist_cost,
+                        playlist.title,
+                    )
+                )
+
+        for track in TrackManager.find_unmatched():
+            query = YouService.search_query(track)
+            cached = YouService.get_cached_search(query) is not NOTHING
+            cost = 0 if cached else YouService.search_cost
+            title = f"{track.artist} - {track.name}"
+            tasks.append(cls.task(TaskType.MATCH, track.id, cost, title))
+
+        for playlist in playlists:
+            tasks.append(
+                cls.task(
+                    TaskType.SYNC,
+                    playlist.id,
+                    cls.estimate_sync(playlist),
+                    playlist.title,
+                )
+            )
+
+        return sorted(tasks)
+
+    @classmethod
+    def task(cls, type: TaskType, key: Any, cost: int, title: str) -> Task:
+        return Task(
+            priority=cls.priorities[type],
+            type=str(type),
+            key=key,
+            cost=cost,
+            title=title,
+        )
+
+    @classmethod
+    def estimate_sync(cls, playlist: Playlist) -> int:
+        """
+        Estimate the cost to sync the playlist items, the online items are
+        unknown until they are listed so previously uploaded playlists are
+        only charged for listing them.
+        """
+        cost = cls.estimate_listing(playlist)
+        if playlist.uploaded is None:
+            matched = [
+                track
+                for track in TrackManager.get_many(playlist.tracks)
+                if track.youtube_id is not None
+            ]
+            cost += len(matched) * YouService.create_playlist_item_cost
+        return cost
+
+    @classmethod
+    def estimate_listing(cls, playlist: Playlist) -> int:
+        pages = max(1, -(-len(playlist.tracks) // YouService.max_results))
+        return pages * YouService.list_playlist_items_cost
+
+    @classmethod
+    def plan(cls, tasks: List[Task], remaining: int) -> Tuple[List, List]:
+        """
+        Split the tasks to the ones that fit in the remaining quota and the
+        deferred ones. Lower priority tasks may still fit after a deferred
+        one, except for the sync of a playlist that is not created yet.
+
+        :param tasks: The pending tasks
+        :param int remaining: The remaining quota
+        """
+        today: List[Task] = []
+        deferred: List[Task] = []
+        for task in tasks:
+            blocked = task.type == str(TaskType.SYNC) and any(
+                other.type == str(TaskType.PLAYLIST) and other.key == task.key
+                for other in deferred
+            )
+            if blocked or task.cost > remaining:
+                deferred.append(task)
+            else:
+                remaining -= task.cost
+                today.append(task)
+
+        return today, deferred
+
+    @classmethod
+    def pending(
+        cls, tasks: List[Task], now: Optional[int] = None
+    ) -> Tuple[List[Task], List[Task]]:
+        """
+        Merge the tasks with the stored schedule, return the due tasks with
+        the resumed ones first in their priority and the tasks still waiting
+        for the quota reset. Stored tasks without pending work are dropped.
+
+        :param tasks: The pending tasks
+        :param int now: The current timestamp
+        """
+        now = timestamp() if now is None else now
+        stored = {task.id: task for task in cls.schedule()}
+        due: List[Task] = []
+        waiting: List[Task] = []
+        for task in tasks:
+            resume = stored[task.id].resume if task.id in stored else None
+            if resume is not None and resume > now:
+                task.resume = resume
+                waiting.append(task)
+            else:
+                due.append(task)
+
+        due.sort(key=lambda task: (task.priority, task.id not in stored))
+        return due, waiting
+
+    @classmethod
+    def run(cls, tasks: List[Task]) -> Iterator[Tuple[Task, bool]]:
+        """
+        Run the due tasks that fit in today's quota and yield them with
+        whether they completed. The rest are deferred until the next reset.
+        """
+        due, waiting = cls.pending(tasks)
+        budget = YouService.get_quota_budget()
+        today, deferred = cls.plan(due, budget.limit - budget.usage)
+        for task in today:
+            if cls.execute(task):
+                yield task, True
+            else:
+                deferred.append(task)
+                yield task, False
+
+        cls.defer(deferred + waiting)
+
+    @classmethod
+    def execute(cls, task: Task) -> bool:
+        """Run the task if the remaining quota allows it."""
+        if task.type == str(TaskType.SYNC):
+            return cls.sync(PlaylistManager.get(task.key))
+
+        if not YouService.get_quota_budget().reserve(task.cost):
+            return False
+
+        if task.type == str(TaskType.PLAYLIST):
+            playlist = PlaylistManager.get(task.key)
+            youtube_id = YouService.create_playlist(playlist)
+            PlaylistManager.update(playlist, {"youtube_id": youtube_id})
+        else:
+            track = TrackManager.get(task.key)
+            TrackManager.set_youtube_id(track, YouService.search_track(track))
+        return True
+
+    @classmethod
+    def sync(cls, playlist: Playlist) -> bool:
+        """
+        Add and remove the playlist items, as many as the remaining quota
+        allows. Return whether the playlist is in sync, the sync is retried
+        if any item failed.
+        """
+        budget = YouService.get_quota_budget()
+        if not playlist.youtube_id or not budget.reserve(
+            cls.estimate_listing(playlist)
+        ):
+            return False
+
+        items = YouService.get_playlist_items(playlist)
+        add, remove = Session.playlist_changes(playlist, items)
+
+        budget = YouService.get_quota_budget()
+        cost = YouService.create_playlist_item_cost
+        to_add = add[: cls.affordable(budget, cost, len(add))]
+        added: List[str] = []
+        failed: List[Tuple[str, Exception]] = []
+        if to_add:
+            results = YouService.create_playlist_items(
+                playlist, to_add, position=len(items)
+            )
+            added, failed = Session.split_errors(to_add, results)
+
+        cost = YouService.remove_playlist_item_cost
+        to_remove = remove[: cls.affordable(budget, cost, len(remove))]
+        removed: List[str] = []
+        if to_remove:
+            results = YouService.remove_playlist_items(to_remove)
+            removed, errors = Session.split_errors(
+                [item.video_id for item in to_remove], results
+            )
+            failed.extend(errors)
+
+        if added or removed:
+            PlaylistManager.update(playlist, {"uploaded": timestamp()})
+
+        return not failed and len(to_add) == len(add) and len(to_remove) == len(remove)
+
+    @staticmethod
+    def affordable(budget: QuotaBudget, cost: int, total: int) -> int:
+        """Reserve up to total requests and return how many fit."""
+        count = 0
+        while count < total and budget.reserve(cost):
+            count += 1
+        return count
+
+    @classmethod
+    def defer(cls, tasks: List[Task]):
+        """
+        Replace the stored schedule with the deferred tasks, they resume
+        after the next quota reset unless they are already waiting for it.
+        """
+        resume = YouService.quota_reset()
+        with Registry.transaction():
+            Registry.set(cls.namespace, {})
+            for task in tasks:
+                task.resume = task.resume or resume
+                Registry.set(cls.namespace, task.id, task.asdict())
+
+    @classmethod
+    def schedule(cls) -> List[Task]:
+        """Return the stored deferred tasks."""
+        data = Registry.get(cls.namespace, default={})
+        return sorted(Task(**raw) for raw in data.values())
@@ -1,56 +1,241 @@
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from contextlib import suppress
 from datetime import datetime
 from datetime import timedelta
+from datetime import timezone
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+from urllib.parse import urlencode
 
 from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.errors import HttpError
 
 from pytuber.core.models import ConfigManager
 from pytuber.core.models import Playlist
 from pytuber.core.models import PlaylistItem
 from pytuber.core.models import Provider
 from pytuber.core.models import Track
+from pytuber.storage import NOTHING
 from pytuber.storage import Registry
 
 
+class QuotaBudget:
+    """
+    Thread safe youtube quota counter, costs are reserved before each request
+    and rejected once they would exceed the limit.
+    """
+
+    def __init__(self, limit: int, usage: int = 0):
+        self.limit = limit
+        self.usage = usage
+        self.lock = threading.Lock()
+
+    def reserve(self, cost: int) -> bool:
+        with self.lock:
+            if self.usage + cost > self.limit:
+                return False
+
+            self.usage += cost
+            return True
+
+
 class YouService:
     max_results = 50
-    client = None
+    batch_size = 50
+    clients = threading.local()
+    credentials = None
+    discovery = None
     scopes = ["https://www.googleapis.com/auth/youtube"]
     quota_key = "youtube_quota"
+    search_key = "youtube_search"
+    search_swept_key = "youtube_search_swept"
+    pages_key = "youtube_pages"
+    token_key = "youtube_token"
+    token_owner = ("client_id", "refresh_token")
+    search_ttl = 90
+    search_sweep_interval = timedelta(days=1)
+    search_cost = 100
+    list_playlists_cost = 3
+    list_playlist_items_cost = 5
+    create_playlist_cost = 55
+    create_playlist_item_cost = 53
+    remove_playlist_item_cost = 51
 
     @classmethod
     def authorize(cls, client_secrets):
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
         return InstalledAppFlow.from_client_secrets_file(
             client_secrets, scopes=cls.scopes
         ).run_local_server()
 
     @classmethod
     def search_track(cls, track: Track):
+        query = cls.search_query(track)
+        video_id = cls.get_cached_search(query)
+        if video_id is NOTHING:
+            video_id = cls.find_video_id(track)
+            cls.update_quota(cls.search_cost)
+            cls.set_cached_search(query, video_id)
+        return video_id
+
+    @classmethod
+    def search_tracks(
+        cls, tracks: Iterable[Track], jobs: int = 1, refresh: bool = False
+    ) -> Iterator[Tuple[Track, Optional[str]]]:
+        """
+        Search the tracks with a pool of workers and yield them with their
+        video ids as they complete. The searches stop being dispatched once
+        their cost would exceed the daily quota limit.
+
+        Cached queries are yielded right away and tracks with the same query
+        share a single search.
+
+        :param tracks: The tracks to match
+        :param int jobs: The number of concurrent searches
+        :param bool refresh: Ignore the cached queries
+        """
+        queue = iter(tracks)
+        budget: Optional[QuotaBudget] = None
+        pending: Dict = {}
+        waiting: Dict[str, List[Track]] = {}
+        dispatching = True
+        try:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                while dispatching or pending:
+                    while dispatching and len(pending) < jobs:
+                        track = next(queue, None)
+                        if track is None:
+                            dispatching = False
+                            break
+
+                        query = cls.search_query(track)
+                        if query in waiting:
+                            waiting[query].append(track)
+                            continue
+
+                        if not refresh:
+                            cached = cls.get_cached_search(query)
+                            if cached is not NOTHING:
+                                yield track, cached
+                                continue
+
+                        if budget is None:
+                            cls.get_client()
+                            budget = cls.get_quota_budget()
+
+                        if budget.reserve(cls.search_cost):
+                            waiting[query] = [track]
+                            future = executor.submit(cls.find_video_id, track)
+                            pending[future] = query
+
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        query = pending.pop(future)
+                        cls.update_quota(cls.search_cost)
+                        video_id = future.result()
+                        cls.set_cached_search(query, video_id)
+                        for track in waiting.pop(query):
+                            yield track, video_id
+        finally:
+            # The executor waited for the searches still in flight when a
+            # search failed or the generator was closed, their quota is
+            # spent and their results are cached for the next run.
+            for future, query in pending.items():
+                cls.update_quota(cls.search_cost)
+                with suppress(Exception):
+                    cls.set_cached_search(query, future.result())
+
+    @staticmethod
+    def search_query(track: Track) -> str:
+        """Return the normalized search query of the track."""
+        return " ".join(f"{track.artist} {track.name}".casefold().split())
+
+    @classmethod
+    def get_cached_search(cls, query: str) -> Any:
+        """Return the cached video id of the query or NOTHING if expired."""
+        entry = Registry.get(cls.search_key, query, default=None)
+        if entry is None or entry[0] is None or entry[1] < time.time():
+            return NOTHING
+        return entry[0]
+
+    @classmethod
+    def set_cached_search(cls, query: str, video_id: Optional[str]):
+        """
+        Cache the video id of the query, misses are not cached because the
+        unmatched tracks are retried on their own backoff schedule.
+        """
+        if video_id is None:
+            with suppress(KeyError):
+                Registry.remove(cls.search_key, query)
+            return
+
+        data = ConfigManager.get(Provider.youtube).data
+        ttl = timedelta(days=data.get("search_ttl", cls.search_ttl))
+        Registry.set(
+            cls.search_key, query, [video_id, time.time() + ttl.total_seconds()]
+        )
+
+    @classmethod
+    def sweep_searches(cls, now: Optional[float] = None) -> int:
+        """
+        Remove the expired search results at most once per sweep interval
+        and return how many were removed.
+
+        :param float now: The current timestamp
+        """
+        now = time.time() if now is None else now
+        swept = Registry.get(cls.search_swept_key, default=None)
+        if swept and swept + cls.search_sweep_interval.total_seconds() > now:
+            return 0
+
+        searches = Registry.get(cls.search_key, default={})
+        expired = [query for query, entry in searches.items() if entry[1] < now]
+        if expired:
+            with Registry.transaction():
+                for query in expired:
+                    Registry.remove(cls.search_key, query)
+        Registry.set(cls.search_swept_key, now)
+        return len(expired)
+
+    @classmethod
+    def find_video_id(cls, track: Track) -> Optional[str]:
         params = {
             "part": "snippet",
+            "fields": "items(id(kind,videoId))",
             "maxResults": 1,
             "q": f"{track.artist} {track.name}",
             "type": "video",
         }
 
         response = cls.get_client().search().list(**params).execute()
-        cls.update_quota(100)
         for item in response.get("items", []):
             if item["id"]["kind"] == "youtube#video":
                 return item["id"]["videoId"]
+        return None
 
     @classmethod
     def get_playlists(cls):
-        params = {"part": "snippet", "mine": True, "maxResults": cls.max_results}
-        next_page_token = None
+        params = {
+            "part": "snippet",
+            "fields": "etag,nextPageToken,items(id,snippet(title,description))",
+            "mine": True,
+            "maxResults": cls.max_results,
+        }
         playlists = []
-        while True:
-            if next_page_token:
-                params.update({"pageToken": next_page_token})
-
-            response = cls.get_client().playlists().list(**params).execute()
-            cls.update_quota(3)
+        for response in cls.list_pages("playlists", params, cls.list_playlists_cost):
             for item in response.get("items", []):
                 playlist = Playlist.from_mime(
                     item["snippet"]["description"].strip().split("\n")[-1]
@@ -61,10 +246,6 @@ class YouService:
                     playlist.youtube_id = item["id"]
                     playlists.append(playlist)
 
-            next_page_token = response.get("nextPageToken")
-            if not next_page_token:
-                break
-
         return playlists
 
     @classmethod
@@ -75,26 +256,23 @@ class YouService:
                 "status": {"privacyStatus": "private"},
             },
             "part": "snippet,status",
+            "fields": "id",
         }
         id = cls.get_client().playlists().insert(**params).execute()["id"]
-        cls.update_quota(55)
+        cls.update_quota(cls.create_playlist_cost)
         return id
 
     @classmethod
     def get_playlist_items(cls, playlist: Playlist):
         items = []
-        next_page_token = None
         params = {
-            "part": "contentDetails,snippet",
+            "part": "snippet",
+            "fields": "etag,nextPageToken,items(id,snippet(title,resourceId/videoId))",
             "maxResults": cls.max_results,
             "playlistId": playlist.youtube_id,
         }
-        while True:
-            if next_page_token:
-                params.update({"pageToken": next_page_token})
-
-            resp = cls.get_client().playlistItems().list(**params).execute()
-            cls.update_quota(5)
+        cost = cls.list_playlist_items_cost
+        for resp in cls.list_pages("playlistItems", params, cost):
             for item in resp.get("items", []):
 
                 try:
@@ -106,51 +284,230 @@ class YouService:
                 items.append(
                     PlaylistItem(
                         id=item["id"],
-                        video_id=item["contentDetails"]["videoId"],
+                        video_id=item["snippet"]["resourceId"]["videoId"],
                         artist=artist.strip(),
                         name=name.strip(),
                     )
                 )
-
-            next_page_token = resp.get("nextPageToken")
-            if not next_page_token:
-                break
         return items
 
+    @classmethod
+    def list_pages(cls, resource: str, params: Dict, cost: int) -> Iterator[Dict]:
+        """
+        Yield the response pages of a listing request. The pages of every
+        listing are stored together with their etags and requested again
+        with If-None-Match, a 304 reply reuses the stored page instead of
+        downloading it again.
+
+        Page tokens change with the listing, the stored pages are matched by
+        their position and replaced when the listing changed.
+
+        :param str resource: The client resource name, eg playlistItems
+        :param dict params: The list request parameters
+        :param int cost: The quota cost of each page
+        """
+        key = f"{resource}?{urlencode(sorted(params.items()))}"
+        cached = Registry.get(cls.pages_key, key, default=[])
+        pages: List[Dict] = []
+        modified = complete = False
+        try:
+            while True:
+                page = cached[len(pages)] if len(pages) < len(cached) else None
+                request = getattr(cls.get_client(), resource)().list(**params)
+                if page and page.get("etag"):
+                    request.headers["If-None-Match"] = page["etag"]
+
+                try:
+                    response = request.execute()
+                    modified = True
+                except HttpError as e:
+                    if page is None or e.resp.status != 304:
+                        raise
+                    response = page
+
+                cls.update_quota(cost)
+                pages.append(response)
+                yield response
+
+                next_page_token = response.get("nextPageToken")
+                if not next_page_token:
+                    complete = True
+                    break
+                params = dict(params, pageToken=next_page_token)
+        finally:
+            # Keep the stored pages that were not reached, drop the ones
+            # past the end of a listing that shrank.
+            if complete:
+                modified = modified or len(pages) != len(cached)
+            else:
+                pages.extend(cached[len(pages) :])
+            if modified:
+                Registry.set(cls.pages_key, key, pages)
+
     @classmethod
     def create_playlist_item(cls, playlist: Playlist, video_id):
-        params = {
-            "body": {
-                "snippet": {
-                    "playlistId": playlist.youtube_id,
-                    "resourceId": {"kind": "youtube#video", "videoId": video_id},
-                }
-            },
-            "part": "snippet",
-        }
+        params = cls.playlist_item_params(playlist, video_id)
         result = cls.get_client().playlistItems().insert(**params).execute()
-        cls.update_quota(53)
+        cls.update_quota(cls.create_playlist_item_cost)
         return result
 
+    @classmethod
+    def create_playlist_items(
+        cls, playlist: Playlist, video_ids: List[str], position: Optional[int] = None
+    ) -> List:
+        """
+        Insert the videos in the playlist with batch requests, return the
+        responses or the errors in the same order.
+
+        The server may execute the requests of a batch in any order, when
+        a starting position is given every item is pinned to its own.
+
+        :param playlist: The youtube playlist
+        :param video_ids: The video ids to insert
+        :param int position: The zero based position of the first video
+        """
+        resource = cls.get_client().playlistItems()
+        requests = [
+            resource.insert(
+                **cls.playlist_item_params(
+                    playlist, video_id, None if position is None else position + i
+                )
+            )
+            for i, video_id in enumerate(video_ids)
+        ]
+        return cls.execute_batch(requests, cost=cls.create_playlist_item_cost)
+
     @classmethod
     def remove_playlist_item(cls, playlist_item: PlaylistItem):
         params = {"id": playlist_item.id}
         result = cls.get_client().playlistItems().delete(**params).execute()
-        cls.update_quota(51)
+        cls.update_quota(cls.remove_playlist_item_cost)
         return result
 
+    @classmethod
+    def remove_playlist_items(cls, playlist_items: List[PlaylistItem]) -> List:
+        """
+        Delete the playlist items with batch requests, return the responses or
+        the errors in the same order.
+        """
+        resource = cls.get_client().playlistItems()
+        requests = [resource.delete(id=item.id) for item in playlist_items]
+        return cls.execute_batch(requests, cost=cls.remove_playlist_item_cost)
+
+    @classmethod
+    def playlist_item_params(
+        cls, playlist: Playlist, video_id: str, position: Optional[int] = None
+    ) -> Dict:
+        snippet: Dict[str, Any] = {
+            "playlistId": playlist.youtube_id,
+            "resourceId": {"kind": "youtube#video", "videoId": video_id},
+        }
+        if position is not None:
+            snippet["position"] = position
+
+        return {"body": {"snippet": snippet}, "part": "snippet", "fields": "id"}
+
+    @classmethod
+    def execute_batch(cls, requests: List, cost: int) -> List:
+        """
+        Execute the requests in batches of `batch_size`, return the responses
+        or the errors in the same order.
+
+        :param requests: The api requests
+        :param int cost: The quota cost of each request
+        """
+        results: List = [None] * len(requests)
+
+        def callback(request_id, response, exception):
+            results[int(request_id)] = exception or response
+
+        for start in range(0, len(requests), cls.batch_size):
+            chunk = requests[start : start + cls.batch_size]
+            batch = cls.get_client().new_batch_http_request(callback=callback)
+            for i, request in enumerate(chunk, start):
+                batch.add(request, request_id=str(i))
+
+            batch.execute()
+            cls.update_quota(cost * len(chunk))
+
+        return results
+
     @classmethod
     def get_client(cls):
-        if not cls.client:
-            info = ConfigManager.get(Provider.youtube).data
-            credentials = Credentials.from_authorized_user_info(info, scopes=cls.scopes)
-            cls.client = build("youtube", "v3", credentials=credentials)
-        return cls.client
+        """
+        Return the api client of the current thread, the underlying http
+        connection is not thread safe. The credentials and the parsed
+        discovery document are shared.
+        """
+        client = getattr(cls.clients, "youtube", None)
+        if not client:
+            if not cls.credentials:
+                info = ConfigManager.get(Provider.youtube).data
+                cls.credentials = Credentials.from_authorized_user_info(
+                    {**info, **cls.get_token(info)}, scopes=cls.scopes
+                )
+            if not cls.discovery:
+                cls.discovery = json.loads(get_static_doc("youtube", "v3"))
+            client = build_from_document(cls.discovery, credentials=cls.credentials)
+            cls.clients.youtube = client
+        return client
+
+    @classmethod
+    def reset_credentials(cls, credentials: Optional[Credentials] = None):
+        """
+        Replace the shared credentials, the api clients built with the
+        previous ones are dropped and rebuilt on their next use.
+        """
+        cls.credentials = credentials
+        cls.clients = threading.local()
+
+    @classmethod
+    def credentials_state(cls) -> Tuple:
+        """Return the stored configuration and token of the credentials."""
+        return (
+            Registry.get(ConfigManager.namespace, str(Provider.youtube), default=None),
+            Registry.get(cls.token_key, default=None),
+        )
+
+    @classmethod
+    def get_token(cls, info: Dict) -> Dict:
+        """
+        Return the stored access token and expiry if it was issued to the
+        configured client and refresh token, otherwise an empty dict.
+        """
+        token = Registry.get(cls.token_key, default={})
+        if any(token.get(key) != info.get(key) for key in cls.token_owner):
+            return {}
+        return {"token": token.get("token"), "expiry": token.get("expiry")}
+
+    @classmethod
+    def save_token(cls):
+        """
+        Store the last access token with its expiry, the next runs reuse it
+        until it expires instead of refreshing it on their first request.
+        """
+        credentials = cls.credentials
+        if not credentials or not credentials.token or not credentials.expiry:
+            return
+
+        token = {
+            "token": credentials.token,
+            "expiry": credentials.expiry.isoformat(),
+            "client_id": credentials.client_id,
+            "refresh_token": credentials.refresh_token,
+        }
+        if token != Registry.get(cls.token_key, default=None):
+            Registry.set(cls.token_key, token)
 
     @classmethod
     def get_quota_usage(cls):
         return Registry.get(cls.quota_key, cls.quota_date(), default=0)
 
+    @classmethod
+    def get_quota_budget(cls) -> QuotaBudget:
+        limit = ConfigManager.get(Provider.youtube).data["quota_limit"]
+        return QuotaBudget(limit=limit, usage=cls.get_quota_usage())
+
     @classmethod
     def update_quota(cls, cost: int):
         """
@@ -163,6 +520,13 @@ class YouService:
         quota = Registry.get(cls.quota_key, date, default=0) + cost
         Registry.set(cls.quota_key, {date: quota})
 
+    @classmethod
+    def quota_reset(cls) -> int:
+        """Return the timestamp of the next daily quota reset."""
+        dt = cls.quota_date(obj=True)
+        midnight = datetime(dt.year, dt.month, dt.day) + timedelta(days=1, hours=8)
+        return int(midnight.replace(tzinfo=timezone.utc).timestamp())
+
     @classmethod
     def quota_date(cls, obj: bool = False):
         """
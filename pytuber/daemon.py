@@ -0,0 +1,300 @@
+import io
+import json
+import os
+import socket
+import sys
+import threading
+import traceback
+from contextlib import contextmanager
+from contextlib import redirect_stderr
+from contextlib import redirect_stdout
+from contextlib import suppress
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+import click
+
+from pytuber.storage import Registry
+
+
+class Channel:
+    """
+    Newline delimited json messages over a connected unix socket, writes
+    are serialized because spinners write from their own thread.
+    """
+
+    def __init__(self, conn: socket.socket):
+        self.conn = conn
+        self.reader = conn.makefile("rb")
+        self.lock = threading.Lock()
+
+    def send(self, **message):
+        data = json.dumps(message).encode("utf-8") + b"\n"
+        with self.lock:
+            self.conn.sendall(data)
+
+    def receive(self) -> Optional[Dict]:
+        line = self.reader.readline()
+        return json.loads(line) if line else None
+
+    def close(self):
+        self.reader.close()
+        self.conn.close()
+
+
+class ChannelWriter(io.RawIOBase):
+    """Binary stream that forwards the command output to the client."""
+
+    def __init__(self, channel: Channel, name: str, tty: bool):
+        super().__init__()
+        self.channel = channel
+        self.name = name
+        self.tty = tty
+
+    def writable(self) -> bool:
+        return True
+
+    def isatty(self) -> bool:
+        return self.tty
+
+    def write(self, data) -> int:
+        self.channel.send(**{self.name: bytes(data).decode("utf-8", "replace")})
+        return len(data)
+
+
+class ChannelReader:
+    """Text input that asks the client for every line, eg for prompts."""
+
+    def __init__(self, channel: Channel):
+        self.channel = channel
+
+    def readline(self, *args) -> str:
+        self.channel.send(read=True)
+        message = self.channel.receive()
+        return message.get("input", "") if message else ""
+
+    def isatty(self) -> bool:
+        return False
+
+
+class Daemon:
+    """
+    Run the cli commands of other processes in a long lived process, the
+    registry, the api clients and their credentials stay warm in memory
+    between commands.
+
+    The commands are received over a unix socket in the application
+    directory and run one at a time. Their output is streamed back to the
+    client and prompts read the client's input. Commands that need the
+    client's terminal, like the editor or the oauth flow, always run in
+    process.
+    """
+
+    filename = "daemon.sock"
+    local_commands = (("batch",), ("daemon",), ("setup",), ("add", "editor"))
+    serving = False
+
+    @classmethod
+    def path(cls) -> str:
+        return os.path.join(click.get_app_dir("pytuber", False), cls.filename)
+
+    @classmethod
+    def supported(cls) -> bool:
+        return hasattr(socket, "AF_UNIX")
+
+    @classmethod
+    def forwards(cls, args: List[str]) -> bool:
+        """Return whether the command line may run in the daemon."""
+        if cls.serving or not cls.supported():
+            return False
+
+        if any(key.endswith("_COMPLETE") for key in os.environ):
+            return False
+
+        names = tuple(str(arg) for arg in args if not str(arg).startswith("-"))
+        return not any(names[: len(cmd)] == cmd for cmd in cls.local_commands)
+
+    @classmethod
+    def connect(cls) -> Optional[Channel]:
+        """Return a channel to the running daemon or None."""
+        if not cls.supported():
+            return None
+
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            conn.connect(cls.path())
+        except OSError:
+            conn.close()
+            return None
+        return Channel(conn)
+
+    @classmethod
+    def forward(cls, args: List[str]) -> Optional[int]:
+        """
+        Run the command line in the daemon and return its exit code, or None
+        if the daemon is not running.
+        """
+        channel = cls.connect()
+        if channel is None:
+            return None
+
+        try:
+            channel.send(
+                args=[str(arg) for arg in args],
+                cwd=os.getcwd(),
+                tty=sys.stdout.isatty(),
+            )
+            while True:
+                message = channel.receive()
+                if message is None:
+                    click.secho("The daemon closed the connection", err=True)
+                    return 1
+                if "out" in message:
+                    sys.stdout.write(message["out"])
+                    sys.stdout.flush()
+                elif "err" in message:
+                    sys.stderr.write(message["err"])
+                    sys.stderr.flush()
+                elif "read" in message:
+                    channel.send(input=sys.stdin.readline())
+                elif "exit" in message:
+                    return message["exit"]
+        finally:
+            channel.close()
+
+    @classmethod
+    def stop(cls) -> bool:
+        """Stop the running daemon, return whether one was running."""
+        channel = cls.connect()
+        if channel is None:
+            return False
+
+        try:
+            channel.send(stop=True)
+            channel.receive()
+        finally:
+            channel.close()
+        return True
+
+    @classmethod
+    def serve(cls, command: click.Command):
+        """Accept and run the forwarded commands until stopped."""
+        path = cls.path()
+        channel = cls.connect()
+        if channel is not None:
+            channel.close()
+            raise click.UsageError(f"A daemon is already listening on {path}")
+
+        with suppress(FileNotFoundError):
+            os.unlink(path)
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        # Only the owner may send commands, clients connect after listen
+        os.chmod(path, 0o600)
+        server.listen()
+        cls.serving = True
+        version = cls.data_version()
+        try:
+            while True:
+                conn, _ = server.accept()
+                channel = Channel(conn)
+                try:
+                    request = channel.receive()
+                    if request and request.get("stop"):
+                        channel.send(exit=0)
+                        break
+                    if request:
+                        version = cls.handle(command, channel, request, version)
+                except OSError:
+                    pass
+                finally:
+                    channel.close()
+        finally:
+            cls.serving = False
+            server.close()
+            with suppress(FileNotFoundError):
+                os.unlink(path)
+
+    @classmethod
+    def handle(
+        cls, command: click.Command, channel: Channel, request: Dict, version: int
+    ) -> int:
+        """
+        Run a forwarded command and return the storage data version after it.
+        The registry is reloaded first if another process changed the storage
+        in the meantime, and the youtube clients are rebuilt if their
+        credentials changed.
+        """
+        registry = Registry()
+        if registry.database and cls.data_version() != version:
+            # The youtube service is only loaded by the commands that use it
+            services = sys.modules.get("pytuber.core.services")
+            state = services.YouService.credentials_state() if services else None
+            path = registry.database.path
+            Registry.clear()
+            Registry.from_file(path)
+            if services and services.YouService.credentials_state() != state:
+                services.YouService.reset_credentials()
+        registry.flushed.clear()
+
+        tty = request.get("tty", False)
+        with cls.redirect(channel, tty), cls.chdir(request.get("cwd")):
+            try:
+                code = command.main(
+                    request["args"], prog_name="pytuber", standalone_mode=False
+                )
+            except click.ClickException as e:
+                e.show()
+                code = e.exit_code
+            except click.Abort:
+                click.echo("Aborted!", err=True)
+                code = 1
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else 1
+            except Exception:
+                traceback.print_exc()
+                code = 1
+
+        channel.send(exit=code if isinstance(code, int) else 0)
+        return cls.data_version()
+
+    @staticmethod
+    def data_version() -> int:
+        database = Registry().database
+        if not database:
+            return 0
+        return database.connection.execute("PRAGMA data_version").fetchone()[0]
+
+    @staticmethod
+    @contextmanager
+    def redirect(channel: Channel, tty: bool) -> Iterator:
+        stdout, stderr = (
+            io.TextIOWrapper(
+                ChannelWriter(channel, name, tty),  # type: ignore
+                encoding="utf-8",
+                line_buffering=True,
+                write_through=True,
+            )
+            for name in ("out", "err")
+        )
+        stdin = sys.stdin
+        sys.stdin = ChannelReader(channel)  # type: ignore
+        try:
+            with redirect_stdout(stdout), redirect_stderr(stderr):
+                yield
+        finally:
+            sys.stdin = stdin
+
+    @staticmethod
+    @contextmanager
+    def chdir(path: Optional[str]) -> Iterator:
+        cwd = os.getcwd()
+        if path:
+            os.chdir(path)
+        try:
+            yield
+        finally:
+            os.chdir(cwd)
@@ -1,5 +0,0 @@
-from pytuber.lastfm.commands.cmd_add import add
-from pytuber.lastfm.commands.cmd_fetch import fetch
-from pytuber.lastfm.commands.cmd_setup import setup
-
-__all__ = ["add", "setup", "fetch"]
@@ -1,11 +1,7 @@
-from typing import List
-
 import click
 from tabulate import tabulate
 
-from pytuber.core.models import PlaylistManager
-from pytuber.core.models import Provider
-from pytuber.core.models import TrackManager
+from pytuber.api import Session
 from pytuber.lastfm.services import LastService
 from pytuber.utils import spinner
 
@@ -28,27 +24,13 @@ def fetch(ctx: click.Context, tracks: bool = False, tags: bool = False):
 
 
 def fetch_tracks(*args):
-    kwargs = {"provider": Provider.lastfm}
-    if args:
-        kwargs["id"] = lambda x: x in args
+    session = Session.current()
 
     # So wrong, but yaspin doesn't support nested spinners
     LastService.get_tags()
     with spinner("Fetching track lists") as sp:
-        for playlist in PlaylistManager.find(**kwargs):
-            tracklist = LastService.get_tracks(type=playlist.type, **playlist.arguments)
-
-            track_ids: List[str] = []
-            for entry in tracklist:
-                id = TrackManager.set(
-                    {"artist": entry.artist.name, "name": entry.name}
-                ).id
-
-                if id not in track_ids:
-                    track_ids.append(id)
-
+        for playlist, track_ids in session.fetch_lastfm_tracks(*args):
             sp.write(f"Playlist: {playlist.id} - {len(track_ids)} tracks")
-            PlaylistManager.update(playlist, {"tracks": track_ids})
 
 
 def fetch_tags():
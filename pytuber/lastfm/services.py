@@ -60,7 +60,8 @@ class LastService:
     def get_tags(cls, refresh=False) -> List[Tag]:
         """
         Return a list of the most popular last.fm tags. The result will be
-        cached for 30 days.
+        cached for 30 days, after that or a few days before that the cached
+        list is returned while it's refreshed in the background.
 
         \f
         :rtype: :class:`list` of :class:`pydrag.Tag`
@@ -86,6 +87,8 @@ class LastService:
                 ttl=timedelta(days=30),
                 func=retrieve_tags,
                 refresh=refresh,
+                stale=timedelta(days=365),
+                ahead=timedelta(days=3),
             )
         ]
 
@@ -1,11 +1,23 @@
 import json
+import os
+import sqlite3
+import threading
 import time
+from concurrent.futures import Future
+from contextlib import contextmanager
 from contextlib import suppress
 from datetime import timedelta
 from functools import reduce
 from json import JSONDecodeError
+from typing import Any
 from typing import Callable
 from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Set
+from typing import Tuple
 
 
 class Singleton(type):
@@ -20,7 +32,358 @@ class Singleton(type):
 NOTHING = object()
 
 
+class Database:
+    """
+    SQLite storage engine, every registry namespace is a table of json
+    encoded rows keyed by id and every other top level entry is a row of the
+    root table.
+
+    Changes are appended to the write-ahead journal next to the database
+    and are compacted into it once the journal grows over `journal_limit`
+    bytes.
+    """
+
+    root = "__root__"
+    cache = "cache"
+    cache_index = "cache_index"
+    header = b"SQLite format 3\x00"
+    journal_limit = 4 * 1024 * 1024
+    max_variables = 999
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+
+        page_size = self.connection.execute("PRAGMA page_size").fetchone()[0]
+        pages = max(1, self.journal_limit // page_size)
+        self.connection.execute(f"PRAGMA wal_autocheckpoint = {pages}")
+
+    @property
+    def journal(self) -> str:
+        return f"{self.path}-wal"
+
+    @classmethod
+    def is_database(cls, path: str) -> bool:
+        with open(path, "rb") as fp:
+            return fp.read(len(cls.header)) == cls.header
+
+    @staticmethod
+    def quote(name: str) -> str:
+        return '"{}"'.format(str(name).replace('"', '""'))
+
+    def close(self):
+        self.connection.close()
+
+    def compact(self):
+        """Merge the journal into the database if it exceeds the limit."""
+        with suppress(FileNotFoundError):
+            if os.path.getsize(self.journal) > self.journal_limit:
+                self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def tables(self) -> List[str]:
+        cursor = self.connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name != ?",
+            (self.root,),
+        )
+        return [name for name, in cursor]
+
+    def read(self, table: str, key: str) -> Any:
+        with suppress(sqlite3.OperationalError):
+            row = self.connection.execute(
+                f"SELECT value FROM {self.quote(table)} WHERE id = ?", (str(key),)
+            ).fetchone()
+            if row:
+                return json.loads(row[0])
+        raise KeyError(key)
+
+    def read_many(self, table: str, keys: List[str]) -> Dict[str, Any]:
+        result: Dict[str, Any] = {}
+        with suppress(sqlite3.OperationalError):
+            for i in range(0, len(keys), self.max_variables):
+                chunk = [str(key) for key in keys[i : i + self.max_variables]]
+                cursor = self.connection.execute(
+                    f"SELECT id, value FROM {self.quote(table)} "
+                    f"WHERE id IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                )
+                result.update((key, json.loads(value)) for key, value in cursor)
+        return result
+
+    def keys(self, table: str) -> List[str]:
+        with suppress(sqlite3.OperationalError):
+            cursor = self.connection.execute(
+                f"SELECT id FROM {self.quote(table)} ORDER BY rowid"
+            )
+            return [key for key, in cursor]
+        return []
+
+    def rows(self, table: str) -> Iterable:
+        with suppress(sqlite3.OperationalError):
+            cursor = self.connection.execute(
+                f"SELECT id, value FROM {self.quote(table)} ORDER BY rowid"
+            )
+            for key, value in cursor:
+                yield key, json.loads(value)
+
+    def search(self, table: str, field: str, value: Any) -> List[str]:
+        """
+        Return the ids of the rows with the given field value, the lookup is
+        backed by an index on the json field which is created on first use.
+
+        :param str table: The table name
+        :param str field: The top level row field name
+        :param value: A string to match or None to match missing values
+        """
+        if not field.isidentifier():
+            raise ValueError(f"Invalid index field: {field}")
+
+        expression = f"json_extract(value, '$.{field}')"
+        self.connection.execute(
+            f"CREATE INDEX IF NOT EXISTS {self.quote(f'{table}.{field}')} "
+            f"ON {self.quote(table)} ({expression})"
+        )
+        params: Tuple = ()
+        if value is None:
+            condition = f"{expression} IS NULL"
+        else:
+            condition, params = f"{expression} = ?", (value,)
+
+        cursor = self.connection.execute(
+            f"SELECT id FROM {self.quote(table)} WHERE {condition} ORDER BY rowid",
+            params,
+        )
+        return [key for key, in cursor]
+
+    def create(self, table: str):
+        self.connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.quote(table)} "
+            "(id TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+
+    def drop(self, table: str):
+        self.connection.execute(f"DROP TABLE IF EXISTS {self.quote(table)}")
+
+    def write(self, table: str, key: str, value: Any):
+        # Upserts need sqlite 3.24, updating first also keeps the row order
+        params = (json.dumps(value), str(key))
+        cursor = self.connection.execute(
+            f"UPDATE {self.quote(table)} SET value = ? WHERE id = ?", params
+        )
+        if cursor.rowcount == 0:
+            self.connection.execute(
+                f"INSERT INTO {self.quote(table)} (value, id) VALUES (?, ?)", params
+            )
+
+    def delete(self, table: str, key: str):
+        self.connection.execute(
+            f"DELETE FROM {self.quote(table)} WHERE id = ?", (str(key),)
+        )
+
+    @staticmethod
+    def is_cache_entry(value: Any) -> bool:
+        return (
+            isinstance(value, list)
+            and len(value) == 2
+            and isinstance(value[1], (int, float))
+        )
+
+    @classmethod
+    def from_legacy(cls, path: str) -> "Database":
+        """
+        Convert the json storage of older versions to a database, the
+        original file is kept next to the new one with a `.json` suffix.
+        Cache entries are moved from the top level to their own table.
+
+        :param str path: The storage file path
+        :rtype: Database
+        """
+        data: Dict = {}
+        with suppress(JSONDecodeError, UnicodeDecodeError):
+            with open(path) as fp:
+                data = json.load(fp)
+
+        os.replace(path, f"{path}.json")
+        database = cls(path)
+        with database.connection:
+            database.create(cls.root)
+            for name, value in data.items():
+                if isinstance(value, dict):
+                    database.create(name)
+                    for key, row in value.items():
+                        database.write(name, key, row)
+                elif cls.is_cache_entry(value):
+                    database.create(cls.cache)
+                    database.write(cls.cache, name, value)
+                else:
+                    database.write(cls.root, name, value)
+        return database
+
+
+class Table(dict):
+    """
+    A registry namespace, rows are read from the database on first access
+    and every row changed in memory is tracked until it is flushed.
+    """
+
+    def __init__(self, name: str, database: Optional[Database] = None):
+        super().__init__()
+        self.name = name
+        self.database = database
+        self.loaded = database is None
+        self.dirty: Dict = {}
+
+    def __missing__(self, key):
+        if self.loaded or key in self.dirty:
+            raise KeyError(key)
+
+        value = self.database.read(self.name, key)
+        dict.__setitem__(self, key, value)
+        return value
+
+    def __delitem__(self, key):
+        self[key]
+        dict.__delitem__(self, key)
+        self.touch(key)
+
+    def __contains__(self, key):
+        try:
+            self[key]
+            return True
+        except KeyError:
+            return False
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        return dict.__eq__(self.load(), other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        """Return the row keys, only the ids are read if not loaded yet."""
+        if self.loaded:
+            return dict.keys(self)
+
+        stored = self.database.keys(self.name)
+        keys = [
+            key
+            for key in stored
+            if key not in self.dirty or dict.__contains__(self, key)
+        ]
+        stored_keys = set(stored)
+        keys.extend(key for key in dict.keys(self) if key not in stored_keys)
+        return keys
+
+    def values(self):
+        return dict.values(self.load())
+
+    def items(self):
+        return dict.items(self.load())
+
+    def get_many(self, keys: Iterable) -> Dict:
+        """
+        Return the existing rows for the given keys, rows not in memory are
+        read from the database in a single query.
+        """
+        keys = list(keys)
+        if self.database and not self.loaded:
+            missing = [
+                key
+                for key in keys
+                if not dict.__contains__(self, key) and key not in self.dirty
+            ]
+            if missing:
+                for key, value in self.database.read_many(self.name, missing).items():
+                    dict.__setitem__(self, key, value)
+
+        return {
+            key: dict.__getitem__(self, key)
+            for key in keys
+            if dict.__contains__(self, key)
+        }
+
+    def search(self, field: str, value: Any) -> List:
+        """
+        Return the keys of the rows with the given field value, stored rows
+        are matched through the database index.
+        """
+
+        def match(row):
+            return isinstance(row, dict) and row.get(field) == value
+
+        if self.database and not self.loaded:
+            try:
+                stored = self.database.search(self.name, field, value)
+            except sqlite3.OperationalError:
+                self.load()
+            else:
+                keys = [key for key in stored if key not in self.dirty]
+                keys.extend(
+                    key
+                    for key in self.dirty
+                    if dict.__contains__(self, key)
+                    and match(dict.__getitem__(self, key))
+                )
+                return keys
+
+        return [key for key, row in dict.items(self) if match(row)]
+
+    def touch(self, key):
+        """Mark a row as changed, the order of changes is preserved."""
+        self.dirty[key] = None
+
+    def load(self) -> "Table":
+        if self.database and not self.loaded:
+            memory = dict(dict.items(self))
+            dict.clear(self)
+            for key, value in self.database.rows(self.name):
+                if key in memory:
+                    dict.__setitem__(self, key, memory.pop(key))
+                elif key not in self.dirty:
+                    dict.__setitem__(self, key, value)
+
+            dict.update(self, memory)
+            self.loaded = True
+        return self
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    entries: int
+    size: int
+    max_entries: int
+    max_size: int
+
+
 class Registry(dict, metaclass=Singleton):
+    database: Optional[Database] = None
+    cache_max_entries = 512
+    cache_max_size = 4 * 1024 * 1024
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dirty: Dict = {}
+        self.flushed: Set[str] = set()
+        self.transactions = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.revalidating: Dict = {}
+        self.accessed: Dict = {}
+
     @classmethod
     def exists(cls, *keys):
         try:
@@ -40,42 +403,409 @@ class Registry(dict, metaclass=Singleton):
 
     @classmethod
     def set(cls, *args):
-        data = cls()
+        registry = cls()
         *keys, value = args
 
-        for key in keys[:-1]:
-            data = data.setdefault(key, {})
-        data[keys[-1]] = value
+        if cls.exists(*keys) and cls.get(*keys) == value:
+            return
+
+        if len(keys) == 1:
+            if isinstance(value, dict):
+                table = Table(keys[0])
+                dict.update(table, value)
+                value = table
+            registry[keys[0]] = value
+            registry.dirty[keys[0]] = None
+        else:
+            data = registry
+            for depth, key in enumerate(keys[:-1]):
+                try:
+                    data = data[key]
+                except KeyError:
+                    data[key] = Table(key, registry.database) if depth == 0 else {}
+                    data = data[key]
+
+            data[keys[-1]] = value
+            registry[keys[0]].touch(keys[1])
+
+        cls.flush()
 
     @classmethod
     def remove(cls, *args):
-        data = cls()
+        registry = cls()
 
+        data = registry
         for key in args[:-1]:
             data = data[key]
         del data[args[-1]]
 
+        if len(args) == 1:
+            registry.dirty[args[0]] = None
+        else:
+            registry[args[0]].touch(args[1])
+        cls.flush()
+
+    @classmethod
+    def get_many(cls, namespace: str, keys: Iterable) -> Dict:
+        """
+        Return a namespace rows by their keys, missing keys are skipped.
+
+        :param str namespace: The namespace to read from
+        :param keys: The row keys
+        """
+        table = cls.get(namespace, default=None)
+        return table.get_many(keys) if isinstance(table, Table) else {}
+
+    @classmethod
+    def search(cls, namespace: str, field: str, value: Any) -> List:
+        """
+        Return the keys of a namespace rows with the given field value.
+
+        :param str namespace: The namespace to search
+        :param str field: The top level row field name
+        :param value: A string to match or None to match missing values
+        """
+        table = cls.get(namespace, default=None)
+        return table.search(field, value) if isinstance(table, Table) else []
+
     @classmethod
     def clear(cls):
-        dict.clear(cls())
+        registry = cls()
+        if registry.database:
+            registry.database.close()
+
+        dict.clear(registry)
+        registry.dirty.clear()
+        registry.flushed.clear()
+        registry.database = None
+        registry.transactions = 0
+        registry.cache_hits = 0
+        registry.cache_misses = 0
+        registry.revalidating.clear()
+        registry.accessed.clear()
+
+    @classmethod
+    def changed(cls) -> List:
+        """
+        Return the top level keys and namespaces that changed since the last
+        persist.
+        """
+        registry = cls()
+        names = list(registry.dirty)
+        names.extend(
+            name
+            for name, table in registry.items()
+            if isinstance(table, Table) and table.dirty and name not in names
+        )
+        return names
+
+    @classmethod
+    def modified(cls) -> Set[str]:
+        """
+        Return the top level keys and namespaces that changed since the
+        registry was loaded, whether they are already flushed or not.
+        """
+        registry = cls()
+        return registry.flushed.union(cls.changed())
 
     @classmethod
     def persist(cls, path):
-        with suppress(FileNotFoundError):
-            with open(path, "w") as fp:
-                json.dump(cls(), fp)
+        """
+        Save the pending changes and sweep the cache, the finished background
+        revalidations are cached and the running ones are not waited for.
+        """
+        registry = cls()
+        cls.revalidated()
+        cls.sweep()
+
+        # The cache access times are only written along other changes
+        if registry.accessed and cls.modified():
+            index = cls.get(Database.cache_index, default={})
+            with cls.transaction():
+                for key, meta in registry.accessed.items():
+                    if key in index:
+                        cls.set(Database.cache_index, key, meta)
+            registry.accessed.clear()
+
+        if cls.changed():
+            with suppress(sqlite3.DatabaseError):
+                cls.attach(path)
+            cls.flush()
+
+        if registry.database:
+            registry.database.compact()
+
+    @classmethod
+    @contextmanager
+    def transaction(cls):
+        """Defer flushing changes until the outermost transaction exits."""
+        registry = cls()
+        registry.transactions += 1
+        try:
+            yield registry
+        finally:
+            registry.transactions -= 1
+            cls.flush()
+
+    @classmethod
+    def flush(cls):
+        """
+        Write the pending changes to the database journal in a single
+        transaction.
+        """
+        registry = cls()
+        database = registry.database
+        if not database or registry.transactions or not cls.changed():
+            return
+
+        registry.flushed.update(cls.changed())
+        with database.connection:
+            database.create(database.root)
+            for name in registry.dirty:
+                database.drop(name)
+                database.delete(database.root, name)
+
+                value = dict.get(registry, name, NOTHING)
+                if isinstance(value, Table):
+                    database.create(name)
+                    value.dirty.update(dict.fromkeys(dict.keys(value)))
+                elif value is not NOTHING:
+                    database.write(database.root, name, value)
+
+            for name, table in registry.items():
+                if not isinstance(table, Table) or not table.dirty:
+                    continue
+
+                database.create(name)
+                for key in table.dirty:
+                    if dict.__contains__(table, key):
+                        database.write(name, key, dict.__getitem__(table, key))
+                    else:
+                        database.delete(name, key)
+
+                table.database = database
+                table.dirty.clear()
+
+        registry.dirty.clear()
+
+    @classmethod
+    def attach(cls, path: str):
+        """
+        Open the storage database and register its namespaces, rows are only
+        read when they are accessed. Entries already in memory take precedence
+        over the stored ones.
+
+        :param str path: The storage file path
+        """
+        registry = cls()
+        if registry.database:
+            return
+
+        if os.path.isfile(path) and not Database.is_database(path):
+            database = Database.from_legacy(path)
+        else:
+            database = Database(path)
+
+        registry.database = database
+        for name in database.tables():
+            table = dict.get(registry, name)
+            if table is None and name not in registry.dirty:
+                dict.__setitem__(registry, name, Table(name, database))
+            elif isinstance(table, Table) and name not in registry.dirty:
+                table.database = database
+                table.loaded = False
+
+        for key, value in database.rows(database.root):
+            if key not in registry and key not in registry.dirty:
+                dict.__setitem__(registry, key, value)
 
     @classmethod
     def from_file(cls, path: str):
-        data: Dict = {}
-        with suppress(FileNotFoundError, JSONDecodeError):
-            with open(path) as cfg:
-                data = json.load(cfg)
-        return cls(data)
+        with suppress(sqlite3.DatabaseError):
+            cls.attach(path)
+        return cls()
+
+    @classmethod
+    def cache(
+        cls,
+        key: str,
+        func: Callable,
+        ttl: timedelta,
+        refresh: bool = False,
+        stale: Optional[timedelta] = None,
+        ahead: Optional[timedelta] = None,
+    ):
+        """
+        Return the cached result of the given function or call it and cache
+        the result for the ttl duration.
+
+        Every entry is tracked in the cache index by its expiry including the
+        stale window, last access time and size, the least recently used
+        entries are evicted when the cache grows over `cache_max_entries` or
+        `cache_max_size` bytes. Cache hits only update the index in memory,
+        it's written when the registry is persisted after other changes.
+
+        :param str key: The cache key
+        :param func: The function to call on cache misses
+        :param timedelta ttl: How long the result is fresh for
+        :param bool refresh: Ignore the cached result
+        :param timedelta stale: How long after its expiry the cached result
+            is still returned while it's revalidated in the background
+        :param timedelta ahead: How long before its expiry the cached result
+            is revalidated in the background
+        """
+        registry = cls()
+        cls.revalidated(key)
+
+        now = time.time()
+        window = stale.total_seconds() if stale else 0
+        entry = cls.get(Database.cache, key, default=None)
+        if refresh or entry is None or entry[1] + window < now:
+            registry.cache_misses += 1
+            entry = cls.cache_set(key, func(), ttl, now, stale)
+        else:
+            registry.cache_hits += 1
+            _, _, size = cls.get(
+                Database.cache_index, key, default=[0, 0, cls.sizeof(entry)]
+            )
+            registry.accessed[key] = [entry[1] + window, now, size]
+
+            if entry[1] - (ahead.total_seconds() if ahead else 0) < now:
+                cls.revalidate(key, func, ttl, stale)
+        return entry[0]
+
+    @classmethod
+    def cache_set(
+        cls,
+        key: str,
+        value: Any,
+        ttl: timedelta,
+        now: float,
+        stale: Optional[timedelta] = None,
+    ):
+        entry = (value, now + ttl.total_seconds())
+        expires = entry[1] + (stale.total_seconds() if stale else 0)
+        cls().accessed.pop(key, None)
+        with cls.transaction():
+            cls.set(Database.cache, key, entry)
+            cls.set(Database.cache_index, key, [expires, now, cls.sizeof(entry)])
+            cls.sweep(now)
+        return entry
+
+    @classmethod
+    def revalidate(
+        cls,
+        key: str,
+        func: Callable,
+        ttl: timedelta,
+        stale: Optional[timedelta] = None,
+    ):
+        """
+        Call the function in a background thread, the result is cached when
+        it's next requested or when the registry is persisted once finished.
+        The thread doesn't keep the process alive, an unfinished revalidation
+        is abandoned on exit and the stale entry is revalidated again on its
+        next request.
+        """
+        registry = cls()
+        if key in registry.revalidating:
+            return
+
+        future: Future = Future()
+
+        def run():
+            try:
+                future.set_result(func())
+            except Exception as e:
+                future.set_exception(e)
+
+        registry.revalidating[key] = (future, ttl, stale)
+        threading.Thread(target=run, name=f"revalidate-{key}", daemon=True).start()
+
+    @classmethod
+    def revalidated(cls, key: Optional[str] = None, wait: bool = False):
+        """
+        Cache the results of the finished background revalidations, failed
+        ones are discarded and the stale entries are kept.
+
+        :param str key: Only check the revalidation of this key
+        :param bool wait: Wait for the running revalidations to finish
+        """
+        registry = cls()
+        keys = list(registry.revalidating) if key is None else [key]
+        for name in keys:
+            future, ttl, stale = registry.revalidating.get(name, (None, None, None))
+            if future is None or not (wait or future.done()):
+                continue
+
+            del registry.revalidating[name]
+            with suppress(Exception):
+                cls.cache_set(name, future.result(), ttl, time.time(), stale)
+
+    @classmethod
+    def sweep(cls, now: Optional[float] = None) -> int:
+        """
+        Remove the cache entries past their expiry and stale window and
+        evict the least recently used ones until the cache is within its
+        bounds, return the number of removed entries. Entries missing from
+        the index have an unknown stale window and are only evicted.
+
+        :param float now: The current timestamp
+        """
+        cache = cls.get(Database.cache, default=None)
+        if not cache:
+            return 0
+
+        registry = cls()
+        now = time.time() if now is None else now
+        index = dict(cls.get(Database.cache_index, default={}).items())
+        index.update(
+            (key, meta) for key, meta in registry.accessed.items() if key in index
+        )
+        with cls.transaction():
+            keys = cache.keys()
+            missing = [key for key in keys if key not in index]
+            for key, entry in cls.get_many(Database.cache, missing).items():
+                index[key] = [None, 0, cls.sizeof(entry)]
+                cls.set(Database.cache_index, key, index[key])
+
+            for key in set(index).difference(keys):
+                del index[key]
+                cls.remove(Database.cache_index, key)
+
+            count = len(index)
+            size = sum(meta[2] for meta in index.values())
+            entries = sorted(index.items(), key=lambda item: item[1][1])
+            for key, (expires, _, length) in entries:
+                if (
+                    (expires is None or expires >= now)
+                    and count <= cls.cache_max_entries
+                    and size <= cls.cache_max_size
+                ):
+                    continue
+
+                cls.remove(Database.cache, key)
+                cls.remove(Database.cache_index, key)
+                registry.accessed.pop(key, None)
+                count -= 1
+                size -= length
+
+        return len(index) - count
 
     @classmethod
-    def cache(cls, key: str, func: Callable, ttl: timedelta, refresh: bool = False):
+    def cache_info(cls) -> CacheInfo:
+        """Return the cache statistics of the current session."""
         registry = cls()
-        if refresh or key not in registry or registry[key][1] < time.time():
-            registry[key] = (func(), time.time() + ttl.total_seconds())
-        return registry[key][0]
+        index = cls.get(Database.cache_index, default={})
+        return CacheInfo(
+            hits=registry.cache_hits,
+            misses=registry.cache_misses,
+            entries=len(index),
+            size=sum(meta[2] for meta in index.values()),
+            max_entries=cls.cache_max_entries,
+            max_size=cls.cache_max_size,
+        )
+
+    @staticmethod
+    def sizeof(value: Any) -> int:
+        return len(json.dumps(value))
@@ -1,9 +1,9 @@
 import contextlib
+import threading
 from datetime import datetime
 from typing import Optional
 
 import click
-from yaspin import yaspin
 
 from pytuber.storage import Registry
 
@@ -14,6 +14,17 @@ def magenta(text):
 
 @contextlib.contextmanager
 def spinner(text):
+    """
+    Display a spinner while the block runs and report any error. Background
+    threads don't own the terminal, the block runs silently and errors are
+    raised instead.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        yield None
+        return
+
+    from yaspin import yaspin
+
     sp = yaspin(text=text)
     sp.start()
     try:
@@ -44,4 +55,5 @@ def init_registry(path: str, version: str):
         if Registry.exists("configuration", "youtube", "data"):
             Registry.set("configuration", "youtube", "data", "quota_limit", 1000000)
 
-    Registry.set("version", version)
+    if current_version != version:
+        Registry.set("version", version)
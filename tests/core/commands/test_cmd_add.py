@@ -1,3 +1,5 @@
+import io
+import time
 from unittest import mock
 
 from pytuber.cli import cli
@@ -6,6 +8,7 @@ from pytuber.core.commands.cmd_add import parse_jspf
 from pytuber.core.commands.cmd_add import parse_m3u
 from pytuber.core.commands.cmd_add import parse_text
 from pytuber.core.commands.cmd_add import parse_xspf
+from pytuber.core.commands.cmd_add import unique_tracks
 from pytuber.core.models import PlaylistManager
 from pytuber.core.models import PlaylistType
 from pytuber.core.models import Provider
@@ -21,7 +24,7 @@ class CommandAddTests(CommandTestCase):
         clk_edit.return_value = "foo"
         parse_text.return_value = ["a", "b"]
         self.runner.invoke(cli, ["add", "editor", "--title", "My Cool Playlist"])
-        parse_text.assert_called_once_with("foo")
+        self.assertEqual("foo", parse_text.call_args[0][0].read())
         create_playlist.assert_called_once_with(
             arguments={"_title": "My Cool Playlist"},
             title="My Cool Playlist",
@@ -59,10 +62,11 @@ class CommandAddTests(CommandTestCase):
                     ],
                 )
 
-            jspf.assert_called_once_with("jspf")
-            xspf.assert_called_once_with("xspf")
-            text.assert_called_once_with("txt")
-            m3u.assert_called_once_with("m3u")
+            for parser, mode in ((jspf, "r"), (xspf, "rb"), (text, "r"), (m3u, "r")):
+                parser.assert_called_once()
+                fp = parser.call_args[0][0]
+                self.assertEqual(mode, fp.mode)
+                self.assertTrue(fp.closed)
 
             create_playlist.assert_has_calls(
                 [
@@ -95,6 +99,36 @@ class CommandAddTests(CommandTestCase):
 
 
 class CommandAddUtilsTests(CommandTestCase):
+    def test_unique_tracks(self):
+        tracks = [
+            ("Queen", "Bohemian Rhapsody"),
+            ("queen", "Bohemian  Rhapsody!"),
+            ("AC/DC", "T.N.T."),
+            ("Queen", "Bohemian Rhapsody"),
+            ("AC DC", "TNT"),
+        ]
+        expected = [("Queen", "Bohemian Rhapsody"), ("AC/DC", "T.N.T.")]
+        self.assertEqual(expected, unique_tracks(tracks))
+
+        expected = [tracks[0], tracks[1], tracks[2], tracks[4]]
+        self.assertEqual(expected, unique_tracks(tracks, normalize=False))
+
+    def test_parse_scales_linearly(self):
+        def measure(size):
+            text = "".join(f"artist {i} - name {i}\n" for i in range(size))
+            best = float("inf")
+            for _ in range(3):
+                start = time.perf_counter()
+                tracks = parse_text(io.StringIO(text))
+                best = min(best, time.perf_counter() - start)
+            self.assertEqual(size, len(tracks))
+            return best
+
+        # Four times the tracks take about four times as long, a quadratic
+        # de-duplication would take sixteen
+        ratio = measure(40000) / measure(10000)
+        self.assertLess(ratio, 8)
+
     def test_parse_text(self):
         text = "\n".join(
             (
@@ -110,7 +144,7 @@ class CommandAddUtilsTests(CommandTestCase):
             ("Queen", "Bohemian Rhapsody"),
             ("Queen", "I want to break free"),
         ]
-        self.assertEqual(expected, parse_text(text))
+        self.assertEqual(expected, parse_text(io.StringIO(text)))
 
     def test_parse_xspf(self):
         xml = """<?xml version="1.0" encoding="UTF-8"?>
@@ -141,8 +175,14 @@ class CommandAddUtilsTests(CommandTestCase):
             ("Queen", "Bohemian Rhapsody"),
             ("Queen", "I want to break free"),
         ]
-        self.assertEqual(expected, parse_xspf(xml))
-        self.assertEqual([], parse_xspf(""))
+        self.assertEqual(expected, parse_xspf(io.BytesIO(xml.encode())))
+        self.assertEqual([], parse_xspf(io.BytesIO(b"")))
+
+        xml = b"""<playlist><title>Mix</title><trackList>
+            <track><title>Bohemian Rhapsody</title><creator>Queen</creator></track>
+            </trackList></playlist>"""
+        expected = [("Queen", "Bohemian Rhapsody")]
+        self.assertEqual(expected, parse_xspf(io.BytesIO(xml)))
 
     def test_parse_jspf(self):
         json = """
@@ -177,8 +217,8 @@ class CommandAddUtilsTests(CommandTestCase):
             ("Queen", "Bohemian Rhapsody"),
             ("Queen", "I want to break free"),
         ]
-        self.assertEqual(expected, parse_jspf(json))
-        self.assertEqual([], parse_jspf(""))
+        self.assertEqual(expected, parse_jspf(io.StringIO(json)))
+        self.assertEqual([], parse_jspf(io.StringIO("")))
 
     def test_parse_m3u(self):
         text = "\n".join(
@@ -195,8 +235,8 @@ class CommandAddUtilsTests(CommandTestCase):
             ("Queen", "Bohemian Rhapsody"),
             ("Queen", "I want to break free"),
         ]
-        self.assertEqual(expected, parse_m3u(text))
-        self.assertEqual([], parse_m3u(""))
+        self.assertEqual(expected, parse_m3u(io.StringIO(text)))
+        self.assertEqual([], parse_m3u(io.StringIO("")))
 
     @mock.patch("pytuber.core.commands.cmd_add.magenta")
     @mock.patch.object(PlaylistManager, "set")
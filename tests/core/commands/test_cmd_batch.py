@@ -0,0 +1,81 @@
+from unittest import mock
+
+from pytuber.cli import cli
+from pytuber.core.models import PlaylistManager
+from pytuber.storage import Registry
+from tests.utils import CommandTestCase
+from tests.utils import PlaylistFixture
+
+
+class CommandBatchTests(CommandTestCase):
+    def setUp(self):
+        super().setUp()
+        PlaylistManager.set_many(p.asdict() for p in PlaylistFixture.get(2))
+        self.script = "\n".join(
+            (
+                "# nightly",
+                "pytuber remove id_a  # gone",
+                "",
+                "show nope",
+                "foo",
+                "batch other.txt",
+                "remove 'id_b'",
+            )
+        )
+
+    @mock.patch("pytuber.core.commands.cmd_batch.time.perf_counter")
+    def test_run(self, perf_counter):
+        perf_counter.return_value = 1.0
+        with self.runner.isolated_filesystem():
+            with open("nightly.txt", "w") as fp:
+                fp.write(self.script)
+
+            # The steps run nested in the transaction of the batch
+            depths = []
+            transaction = Registry.transaction
+
+            def nested():
+                depths.append(Registry().transactions)
+                return transaction()
+
+            with mock.patch.object(Registry, "transaction", side_effect=nested):
+                result = self.runner.invoke(
+                    cli, ["batch", "nightly.txt"], input="y\ny\n"
+                )
+
+        self.assertEqual(1, result.exit_code)
+        self.assertEqual([0, 1, 1], depths)
+        self.assertEqual([], PlaylistManager.keys())
+
+        expected = (
+            "Do you want to continue? [y/N]: y",
+            "Removed playlist: id_a!",
+            "[1/5] remove id_a: ok in 0.00s",
+            "Usage: cli show [OPTIONS] ID",
+            "Try 'cli show --help' for help.",
+            "",
+            "Error: No playlist matched your argument: nope!",
+            "[2/5] show nope: failed with exit code 2 in 0.00s",
+            "Usage: cli [OPTIONS] COMMAND [ARGS]...",
+            "Try 'cli --help' for help.",
+            "",
+            "Error: No such command 'foo'.",
+            "[3/5] foo: failed with exit code 2 in 0.00s",
+            "Error: The batch command can't run in a batch",
+            "[4/5] batch other.txt: failed with exit code 2 in 0.00s",
+            "Do you want to continue? [y/N]: y",
+            "Removed playlist: id_b!",
+            "[5/5] remove id_b: ok in 0.00s",
+            "Ran 5 steps in 0.00s, 3 failed",
+        )
+        self.assertOutput(expected, result.output)
+
+    def test_fail_fast(self):
+        result = self.runner.invoke(
+            cli, ["batch", "--fail-fast"], input="list\nshow nope\nlist\n"
+        )
+
+        self.assertEqual(1, result.exit_code)
+        self.assertIn("[2/3] show nope: failed with exit code 2", result.output)
+        self.assertNotIn("[3/3]", result.output)
+        self.assertIn("Ran 2 steps in", result.output)
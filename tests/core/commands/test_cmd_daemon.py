@@ -0,0 +1,33 @@
+from unittest import mock
+
+from pytuber.cli import cli
+from pytuber.daemon import Daemon
+from tests.utils import CommandTestCase
+
+
+class CommandDaemonTests(CommandTestCase):
+    @mock.patch.object(Daemon, "serve")
+    def test_serve(self, serve):
+        serve.side_effect = KeyboardInterrupt
+        result = self.runner.invoke(cli, ["daemon"], catch_exceptions=False)
+
+        self.assertEqual(0, result.exit_code)
+        self.assertOutput([f"Listening on {Daemon.path()}"], result.output)
+        serve.assert_called_once_with(cli)
+
+    @mock.patch.object(Daemon, "stop")
+    def test_stop(self, stop):
+        stop.side_effect = [True, False]
+        result = self.runner.invoke(cli, ["daemon", "--stop"])
+        self.assertOutput(["Daemon stopped"], result.output)
+
+        result = self.runner.invoke(cli, ["daemon", "--stop"])
+        self.assertOutput(["No daemon is running"], result.output)
+
+    @mock.patch.object(Daemon, "supported")
+    def test_unsupported(self, supported):
+        supported.return_value = False
+        result = self.runner.invoke(cli, ["daemon"])
+
+        self.assertEqual(2, result.exit_code)
+        self.assertIn("The daemon requires unix socket support", result.output)
@@ -27,31 +27,57 @@ class CommandFetchTests(CommandTestCase):
         self.runner.invoke(cli, ["fetch", "youtube", "--all"])
 
         fetch_playlists.assert_called_once()
-        fetch_tracks.assert_called_once()
+        fetch_tracks.assert_called_once_with(1, False)
 
-    @mock.patch.object(TrackManager, "update")
-    @mock.patch.object(YouService, "search_track")
-    @mock.patch.object(TrackManager, "find")
-    def test_fetch_tracks(self, find, search, update):
-        track_one, track_two = TrackFixture.get(2)
-        find.return_value = [track_one, track_two]
+    @mock.patch.object(TrackManager, "set_youtube_id")
+    @mock.patch.object(YouService, "search_tracks")
+    @mock.patch.object(TrackManager, "find_unmatched")
+    def test_fetch_tracks(self, find_unmatched, search, set_youtube_id):
+        track_one, track_two, track_three = TrackFixture.get(3)
+        find_unmatched.return_value = [track_one, track_two, track_three]
 
-        search.side_effect = ["y1", "y3"]
+        search.return_value = [(track_two, None), (track_one, "y1")]
+        set_youtube_id.side_effect = lambda track, youtube_id: track
         result = self.runner.invoke(
-            cli, ["fetch", "youtube", "--tracks"], catch_exceptions=False
+            cli,
+            ["fetch", "youtube", "--tracks", "--jobs", "4", "--retry"],
+            catch_exceptions=False,
         )
 
         self.assertEqual(0, result.exit_code)
-        find.assert_called_once_with(youtube_id=None)
-        search.assert_has_calls([mock.call(track_one), mock.call(track_two)])
-        update.assert_has_calls(
-            [
-                mock.call(track_one, {"youtube_id": "y1"}),
-                mock.call(track_two, {"youtube_id": "y3"}),
-            ]
+        self.assertIn("Quota limit reached, 1 tracks left unmatched", result.output)
+        find_unmatched.assert_called_once_with(retry=True)
+        search.assert_called_once_with(
+            find_unmatched.return_value, jobs=4, refresh=True
+        )
+        set_youtube_id.assert_has_calls(
+            [mock.call(track_two, None), mock.call(track_one, "y1")]
+        )
+
+    @mock.patch("pytuber.core.models.timestamp")
+    def test_unmatched(self, timestamp):
+        timestamp.return_value = 1546300800
+        result = self.runner.invoke(
+            cli, ["fetch", "youtube", "--unmatched"], catch_exceptions=False
+        )
+        self.assertOutput(["No unmatched tracks found"], result.output)
+
+        for track in TrackFixture.get(3, youtube_id=[None, "y", None]):
+            TrackManager.set(track.asdict())
+        TrackManager.set_youtube_id(TrackManager.get("id_c"), None)
+
+        result = self.runner.invoke(
+            cli, ["fetch", "youtube", "--unmatched"], catch_exceptions=False
         )
+        expected = (
+            "ID    Artist    Name      Attempts  Last              Next",
+            "----  --------  ------  ----------  ----------------  ----------------",
+            "id_a  artist_a  name_a           0  -                 -",
+            "id_c  artist_c  name_c           1  2019-01-01 00:00  2019-01-02 00:00",
+        )
+        self.assertOutput(expected, result.output)
 
-    @mock.patch.object(TrackManager, "set")
+    @mock.patch.object(TrackManager, "set_many")
     @mock.patch.object(PlaylistManager, "exists")
     @mock.patch.object(PlaylistManager, "set")
     @mock.patch.object(YouService, "get_playlist_items")
@@ -69,7 +95,13 @@ class CommandFetchTests(CommandTestCase):
         v_one, v_two = PlaylistItemFixture.get(2)
         get_playlists.return_value = [p_one, p_two]
         get_playlist_items.return_value = [v_one, v_two]
-        set_tracks.side_effect = TrackFixture.get(2)
+        items = []
+
+        def save(data):
+            items.extend(data)
+            return ["id_a", "id_b"]
+
+        set_tracks.side_effect = save
 
         result = self.runner.invoke(
             cli, ["fetch", "youtube", "--playlists"], catch_exceptions=False
@@ -84,21 +116,18 @@ class CommandFetchTests(CommandTestCase):
         set_playlist.assert_has_calls(
             [mock.call(p_one.asdict()), mock.call(p_two.asdict())]
         )
-        set_tracks.assert_has_calls(
+        self.assertEqual(
             [
-                mock.call(
-                    {
-                        "artist": "artist_a",
-                        "name": "name_a",
-                        "youtube_id": "video_id_a",
-                    }
-                ),
-                mock.call(
-                    {
-                        "artist": "artist_b",
-                        "name": "name_b",
-                        "youtube_id": "video_id_b",
-                    }
-                ),
-            ]
+                {
+                    "artist": "artist_a",
+                    "name": "name_a",
+                    "youtube_id": "video_id_a",
+                },
+                {
+                    "artist": "artist_b",
+                    "name": "name_b",
+                    "youtube_id": "video_id_b",
+                },
+            ],
+            items,
         )
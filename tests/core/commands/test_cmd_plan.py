@@ -0,0 +1,79 @@
+from unittest import mock
+
+from pytuber.cli import cli
+from pytuber.core.planner import Planner
+from pytuber.core.planner import Task
+from pytuber.core.services import QuotaBudget
+from pytuber.core.services import YouService
+from pytuber.storage import Registry
+from pytuber.utils import magenta
+from tests.utils import CommandTestCase
+from tests.utils import ConfigFixture
+
+
+class CommandPlanTests(CommandTestCase):
+    def setUp(self):
+        super().setUp()
+        ConfigFixture.youtube()
+        self.tasks = [
+            Task(0, "playlist", "id_a", 55, "title_a"),
+            Task(1, "match", "id_b", 100, "artist_b - name_b"),
+            Task(2, "sync", "id_a", 5, "title_a"),
+        ]
+
+    @mock.patch.object(Planner, "tasks")
+    def test_with_nothing(self, tasks):
+        tasks.return_value = []
+        result = self.runner.invoke(cli, ["plan"], catch_exceptions=False)
+
+        self.assertEqual(0, result.exit_code)
+        self.assertOutput(["No pending youtube work"], result.output)
+
+    @mock.patch.object(YouService, "get_quota_budget")
+    @mock.patch.object(YouService, "quota_reset")
+    @mock.patch.object(Planner, "tasks")
+    def test_show(self, tasks, quota_reset, get_quota_budget):
+        tasks.return_value = self.tasks
+        quota_reset.return_value = 1550394167
+        get_quota_budget.return_value = QuotaBudget(limit=100, usage=0)
+        result = self.runner.invoke(cli, ["plan"], catch_exceptions=False)
+
+        expected = (
+            "Task      ID    Title                Cost  When",
+            "--------  ----  -----------------  ------  ----------------",
+            "playlist  id_a  title_a                55  today",
+            "sync      id_a  title_a                 5  today",
+            "match     id_b  artist_b - name_b     100  2019-02-17 09:02",
+        )
+        self.assertEqual(0, result.exit_code)
+        self.assertOutput(expected, result.output)
+
+        waiting = Task(2, "sync", "id_a", 5, resume=4102444800)
+        Registry.set("schedule", waiting.id, waiting.asdict())
+        result = self.runner.invoke(cli, ["plan"], catch_exceptions=False)
+
+        expected = (
+            "Task      ID    Title                Cost  When",
+            "--------  ----  -----------------  ------  ----------------",
+            "playlist  id_a  title_a                55  today",
+            "match     id_b  artist_b - name_b     100  2019-02-17 09:02",
+            "sync      id_a  title_a                 5  2100-01-01 00:00",
+        )
+        self.assertOutput(expected, result.output)
+
+    @mock.patch.object(Planner, "schedule")
+    @mock.patch.object(Planner, "run")
+    @mock.patch.object(Planner, "tasks")
+    def test_run(self, tasks, run, schedule):
+        tasks.return_value = self.tasks
+        run.return_value = [(self.tasks[0], True), (self.tasks[2], False)]
+        schedule.return_value = [
+            Task(1, "match", "id_b", 100, resume=1550394167),
+            Task(2, "sync", "id_a", 5, resume=1550394167),
+        ]
+        result = self.runner.invoke(cli, ["plan", "--run"], catch_exceptions=False)
+
+        self.assertEqual(0, result.exit_code)
+        self.assertIn("Deferred 2 tasks until 2019-02-17 09:02", result.output)
+        self.assertIn(f"Completed {magenta(1)} youtube tasks", result.output)
+        run.assert_called_once_with(self.tasks)
@@ -36,6 +36,7 @@ class CommandPushTests(CommandTestCase):
         p_one, p_two = PlaylistFixture.get(2)
         find.return_value = [p_one, p_two]
         create_playlist.side_effect = ["y1", "y2"]
+        update.side_effect = lambda playlist, data: playlist
         result = self.runner.invoke(
             cli, ["push", "youtube", "--playlists"], catch_exceptions=False
         )
@@ -52,21 +53,21 @@ class CommandPushTests(CommandTestCase):
             ]
         )
 
-    @mock.patch("pytuber.core.commands.cmd_push.timestamp")
-    @mock.patch.object(YouService, "remove_playlist_item")
-    @mock.patch.object(YouService, "create_playlist_item")
+    @mock.patch("pytuber.api.timestamp")
+    @mock.patch.object(YouService, "remove_playlist_items")
+    @mock.patch.object(YouService, "create_playlist_items")
     @mock.patch.object(YouService, "get_playlist_items")
-    @mock.patch.object(TrackManager, "find")
+    @mock.patch.object(TrackManager, "get_many")
     @mock.patch.object(PlaylistManager, "update")
     @mock.patch.object(PlaylistManager, "find")
     def test_with_tracks(
         self,
         find_playlists,
         update_playlist,
-        find_tracks,
+        get_tracks,
         get_playlist_items,
-        create_playlist_item,
-        remove_playlist_item,
+        create_playlist_items,
+        remove_playlist_items,
         timestamp,
     ):
 
@@ -79,12 +80,15 @@ class CommandPushTests(CommandTestCase):
         )
 
         find_playlists.return_value = [p_one, p_two]
-        find_tracks.side_effect = [tracks[:3], tracks[3:]]
+        get_tracks.side_effect = [tracks[:3], tracks[3:]]
 
         get_playlist_items.side_effect = [
             [items[0], items[2]],
             [items[1], items[2], items[3]],
         ]
+        create_playlist_items.side_effect = [[{}, Exception("Oups")], []]
+        remove_playlist_items.side_effect = [[{}], Exception("Nope")]
+        update_playlist.side_effect = lambda playlist, data: playlist
 
         result = self.runner.invoke(
             cli, ["push", "youtube", "--tracks"], catch_exceptions=False
@@ -92,24 +96,25 @@ class CommandPushTests(CommandTestCase):
 
         expected_output = (
             "Syncing playlists",
-            "Fetching playlist items: title_a",
-            "Adding new playlist items: 2",
-            "Removing playlist items: 1",
-            "Fetching playlist items: title_b",
-            "Adding new playlist items",
-            "Removing playlist items",
+            "Failed: $c - Oups",
+            "Playlist: title_a - 1 added, 1 removed",
+            "Failed: title_b - Nope",
+            "Playlist: title_b - 0 added, 0 removed",
         )
 
         self.assertEqual(0, result.exit_code)
         self.assertOutputContains(expected_output, result.output)
 
         get_playlist_items.assert_has_calls([mock.call(p_one), mock.call(p_two)])
+        get_tracks.assert_has_calls([mock.call(p_one.tracks), mock.call(p_two.tracks)])
 
-        create_playlist_item.assert_has_calls(
+        create_playlist_items.assert_has_calls(
             [
-                mock.call(p_one, tracks[1].youtube_id),
-                mock.call(p_one, tracks[2].youtube_id),
+                mock.call(
+                    p_one, [tracks[1].youtube_id, tracks[2].youtube_id], position=2
+                ),
+                mock.call(p_two, [], position=3),
             ]
         )
-        remove_playlist_item.assert_called_once_with(items[2])
+        remove_playlist_items.assert_has_calls([mock.call([items[2]]), mock.call([])])
         update_playlist.assert_called_once_with(p_one, {"uploaded": 101})
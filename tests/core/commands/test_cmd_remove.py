@@ -18,7 +18,18 @@ class CommandRemovePlaylistsTests(CommandTestCase):
         )
         self.assertEqual(0, result.exit_code)
         self.assertOutput(expected_output, result.output)
-        remove.assert_has_calls([mock.call("foo"), mock.call("bar")])
+        remove.assert_has_calls(
+            [mock.call("foo", gc=False), mock.call("bar", gc=False)]
+        )
+
+    @mock.patch.object(PlaylistManager, "remove")
+    def test_remove_with_auto_gc(self, remove):
+        result = self.runner.invoke(
+            cli, ["remove", "foo", "--auto-gc"], input="y", catch_exceptions=False
+        )
+
+        self.assertEqual(0, result.exit_code)
+        remove.assert_called_once_with("foo", gc=True)
 
     def test_remove_no_confirm(self):
         result = self.runner.invoke(cli, ["remove", "foo"], input="n")
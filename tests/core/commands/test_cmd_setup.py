@@ -1,3 +1,4 @@
+from datetime import datetime
 from unittest import mock
 
 from google.oauth2.credentials import Credentials
@@ -6,19 +7,24 @@ from pytuber.cli import cli
 from pytuber.core.models import ConfigManager
 from pytuber.core.models import Provider
 from pytuber.core.services import YouService
+from pytuber.storage import Registry
 from tests.utils import CommandTestCase
 
 
 class CommandSetupYoutubeTests(CommandTestCase):
     @mock.patch.object(YouService, "authorize")
     def test_create(self, authorize):
+        self.addCleanup(YouService.reset_credentials)
         authorize.return_value = Credentials(
             token="token",
+            expiry=datetime(2019, 2, 17, 10, 30),
             token_uri="token_uri",
             client_id="client_id",
             client_secret="client_secret",
             scopes="scopes",
         )
+        Registry.set(YouService.token_key, {"token": "old", "expiry": "e"})
+        YouService.clients.youtube = "old client"
 
         self.assertIsNone(ConfigManager.get(Provider.youtube, default=None))
         client_secrets = "~/Downloads/client_secrets.json"
@@ -31,6 +37,7 @@ class CommandSetupYoutubeTests(CommandTestCase):
             "client_id": "client_id",
             "client_secret": "client_secret",
             "quota_limit": 1000000,
+            "search_ttl": 90,
             "refresh_token": None,
             "scopes": "scopes",
             "token_uri": "token_uri",
@@ -38,6 +45,16 @@ class CommandSetupYoutubeTests(CommandTestCase):
         actual = ConfigManager.get(Provider.youtube)
         self.assertDictEqual(expected, actual.data)
 
+        expected = {
+            "token": "token",
+            "expiry": "2019-02-17T10:30:00",
+            "client_id": "client_id",
+            "refresh_token": None,
+        }
+        self.assertEqual(expected, Registry.get(YouService.token_key))
+        self.assertIs(authorize.return_value, YouService.credentials)
+        self.assertIsNone(getattr(YouService.clients, "youtube", None))
+
     def test_update(self):
         ConfigManager.set({"provider": Provider.youtube, "data": {"foo": "bar"}})
         client_secrets = "~/Downloads/client_secrets.json"
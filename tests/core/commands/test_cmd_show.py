@@ -9,13 +9,13 @@ from tests.utils import TrackFixture
 
 
 class CommandShowPlaylistsTests(CommandTestCase):
-    @mock.patch.object(TrackManager, "get")
+    @mock.patch.object(TrackManager, "get_many")
     @mock.patch.object(PlaylistManager, "get")
-    def test_show_playlist(self, get_playlist, get_track):
+    def test_show_playlist(self, get_playlist, get_tracks):
         playlist = PlaylistFixture.one(tracks=[1, 2, 3])
 
         get_playlist.return_value = playlist
-        get_track.side_effect = TrackFixture.get(3, youtube_id=[None, "a", ""])
+        get_tracks.return_value = TrackFixture.get(3, youtube_id=[None, "a", ""])
 
         result = self.runner.invoke(cli, ["show", playlist.id])
 
@@ -39,7 +39,7 @@ class CommandShowPlaylistsTests(CommandTestCase):
         self.assertEqual(0, result.exit_code)
         self.assertOutput(expected_output, result.output)
         get_playlist.assert_called_once_with(playlist.id)
-        get_track.assert_has_calls([mock.call(id) for id in playlist.tracks])
+        get_tracks.assert_called_once_with(playlist.tracks)
 
     @mock.patch.object(PlaylistManager, "get")
     def test_show_playlist_mime(self, get_playlist):
@@ -1,5 +1,8 @@
+import os
+
 import click
 
+from pytuber.core.models import PlaylistIndex
 from pytuber.core.models import PlaylistManager
 from pytuber.core.params import PlaylistParamType
 from pytuber.core.params import ProviderParamType
@@ -20,8 +23,18 @@ class PlaylistParamTypeTests(TestCase):
     def test_complete(self):
         [PlaylistManager.set(p.asdict()) for p in PlaylistFixture.get(2)]
 
-        self.assertEqual(["id_a", "id_b"], self.param.complete(None, ""))
-        self.assertEqual(["id_a"], self.param.complete(None, "id_a"))
+        expected = [("id_a", "title_a"), ("id_b", "title_b")]
+        self.assertEqual(expected, self.param.complete(None, ""))
+        self.assertEqual(expected[:1], self.param.complete(None, "id_a"))
+        self.assertEqual(expected[1:], self.param.complete(None, "TITLE_B"))
+
+        # The index is written once and read on the next completions
+        PlaylistManager.remove("id_a")
+        self.assertEqual(expected, self.param.complete(None, ""))
+
+        path = os.path.join(click.get_app_dir("pytuber"), PlaylistIndex.filename)
+        PlaylistIndex.write(path)
+        self.assertEqual(expected[1:], self.param.complete(None, ""))
 
 
 class ProviderParamTypeTests(TestCase):
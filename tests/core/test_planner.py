@@ -0,0 +1,198 @@
+import time
+from unittest import mock
+
+from pytuber.core.models import PlaylistManager
+from pytuber.core.models import TrackManager
+from pytuber.core.planner import Planner
+from pytuber.core.planner import Task
+from pytuber.core.services import YouService
+from pytuber.storage import Registry
+from tests.utils import ConfigFixture
+from tests.utils import PlaylistFixture
+from tests.utils import PlaylistItemFixture
+from tests.utils import TestCase
+from tests.utils import TrackFixture
+
+
+class PlannerTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        ConfigFixture.youtube()
+        Registry.set("configuration", "youtube", "data", "quota_limit", 300)
+        TrackManager.set_many(
+            t.asdict() for t in TrackFixture.get(3, youtube_id=["$a", None, None])
+        )
+        Registry.set("youtube_search", "artist_c name_c", ["$c", time.time() + 60])
+        PlaylistManager.set(PlaylistFixture.one(tracks=["id_a", "id_b"]).asdict())
+        PlaylistManager.set(
+            PlaylistFixture.one(num=1, youtube_id="$p", uploaded=1).asdict()
+        )
+
+    def test_tasks(self):
+        expected = [
+            Task(0, "playlist", "id_a", 55, "title_a"),
+            Task(1, "match", "id_b", 100, "artist_b - name_b"),
+            Task(1, "match", "id_c", 0, "artist_c - name_c"),
+            Task(2, "sync", "id_a", 58, "title_a"),
+            Task(2, "sync", "id_b", 5, "title_b"),
+        ]
+        actual = Planner.tasks()
+        self.assertEqual(expected, actual)
+        self.assertEqual([55, 100, 0, 58, 5], [task.cost for task in actual])
+
+    def test_plan(self):
+        tasks = Planner.tasks()
+
+        today, deferred = Planner.plan(tasks, 300)
+        self.assertEqual(tasks, today)
+        self.assertEqual([], deferred)
+
+        today, deferred = Planner.plan(tasks, 100)
+        self.assertEqual([tasks[0], tasks[2], tasks[4]], today)
+        self.assertEqual([tasks[1], tasks[3]], deferred)
+
+        today, deferred = Planner.plan(tasks, 50)
+        self.assertEqual([tasks[2], tasks[4]], today)
+        self.assertEqual([tasks[0], tasks[1], tasks[3]], deferred)
+
+        tasks = [Task(0, "playlist", "a", 55), Task(2, "sync", "a", 5)]
+        self.assertEqual(([], tasks), Planner.plan(tasks, 50))
+
+    @mock.patch.object(YouService, "quota_reset")
+    @mock.patch.object(YouService, "create_playlist_items")
+    @mock.patch.object(YouService, "get_playlist_items")
+    @mock.patch.object(YouService, "find_video_id")
+    @mock.patch.object(YouService, "create_playlist")
+    def test_run(
+        self,
+        create_playlist,
+        find_video_id,
+        get_playlist_items,
+        create_playlist_items,
+        quota_reset,
+    ):
+        quota_reset.return_value = 1000
+        create_playlist.side_effect = lambda x: YouService.update_quota(100) or "$n"
+        get_playlist_items.return_value = []
+        YouService.update_quota(150)
+
+        tasks = Planner.tasks()
+        actual = list(Planner.run(tasks))
+
+        self.assertEqual(
+            [(tasks[0], True), (tasks[2], True), (tasks[3], False), (tasks[4], True)],
+            actual,
+        )
+        self.assertEqual("$n", PlaylistManager.get("id_a").youtube_id)
+        self.assertEqual("$c", TrackManager.get("id_c").youtube_id)
+        find_video_id.assert_not_called()
+        create_playlist_items.assert_not_called()
+
+        deferred = [tasks[1], tasks[3]]
+        self.assertEqual(deferred, Planner.schedule())
+        self.assertEqual([1000, 1000], [task.resume for task in Planner.schedule()])
+
+    def test_pending(self):
+        tasks = Planner.tasks()
+        stored = [
+            Task(1, "match", "id_c", 0, resume=50),
+            Task(2, "sync", "id_b", 5, resume=500),
+            Task(0, "playlist", "gone", 55, resume=10),
+        ]
+        for task in stored:
+            Registry.set("schedule", task.id, task.asdict())
+
+        due, waiting = Planner.pending(tasks, now=100)
+        self.assertEqual([tasks[0], tasks[2], tasks[1], tasks[3]], due)
+        self.assertEqual([tasks[4]], waiting)
+        self.assertEqual(500, waiting[0].resume)
+
+    @mock.patch.object(YouService, "quota_reset")
+    @mock.patch.object(YouService, "create_playlist_items")
+    @mock.patch.object(YouService, "get_playlist_items")
+    @mock.patch.object(YouService, "find_video_id")
+    @mock.patch.object(YouService, "create_playlist")
+    def test_run_skips_waiting_tasks(
+        self,
+        create_playlist,
+        find_video_id,
+        get_playlist_items,
+        create_playlist_items,
+        quota_reset,
+    ):
+        quota_reset.return_value = 1000
+        create_playlist.return_value = "$n"
+        find_video_id.return_value = "$b"
+        get_playlist_items.return_value = []
+        create_playlist_items.side_effect = lambda playlist, ids, position: [{}] * len(
+            ids
+        )
+        resume = int(time.time()) + 3600
+        waiting = Task(2, "sync", "id_b", 5, resume=resume)
+        Registry.set("schedule", waiting.id, waiting.asdict())
+
+        tasks = Planner.tasks()
+        actual = [task.id for task, done in Planner.run(tasks) if done]
+
+        expected = ["playlist:id_a", "match:id_b", "match:id_c", "sync:id_a"]
+        self.assertEqual(expected, actual)
+        self.assertEqual([waiting], Planner.schedule())
+        self.assertEqual(resume, Planner.schedule()[0].resume)
+
+    @mock.patch.object(YouService, "remove_playlist_items")
+    @mock.patch.object(YouService, "create_playlist_items")
+    @mock.patch.object(YouService, "get_playlist_items")
+    def test_sync(
+        self, get_playlist_items, create_playlist_items, remove_playlist_items
+    ):
+        TrackManager.update(TrackManager.get("id_b"), {"youtube_id": "$b"})
+        playlist = PlaylistManager.update(
+            PlaylistManager.get("id_a"), {"youtube_id": "$p"}
+        )
+        items = PlaylistItemFixture.get(2, video_id=["$x", "$y"])
+        get_playlist_items.return_value = items
+        create_playlist_items.side_effect = lambda playlist, ids, position: [{}] * len(
+            ids
+        )
+        remove_playlist_items.side_effect = lambda items: [{}] * len(items)
+        YouService.update_quota(190)
+
+        self.assertFalse(Planner.sync(playlist))
+        create_playlist_items.assert_called_once_with(
+            playlist, ["$a", "$b"], position=2
+        )
+        remove_playlist_items.assert_not_called()
+
+        Registry.set("configuration", "youtube", "data", "quota_limit", 1000)
+        self.assertTrue(Planner.sync(playlist))
+        remove_playlist_items.assert_called_once_with(items)
+        self.assertIsNotNone(PlaylistManager.get("id_a").uploaded)
+
+        YouService.update_quota(900)
+        self.assertFalse(Planner.sync(playlist))
+        self.assertEqual(2, get_playlist_items.call_count)
+
+        self.assertFalse(Planner.sync(PlaylistFixture.one(youtube_id=None)))
+
+    @mock.patch.object(YouService, "remove_playlist_items")
+    @mock.patch.object(YouService, "create_playlist_items")
+    @mock.patch.object(YouService, "get_playlist_items")
+    def test_sync_with_failed_items(
+        self, get_playlist_items, create_playlist_items, remove_playlist_items
+    ):
+        TrackManager.update(TrackManager.get("id_b"), {"youtube_id": "$b"})
+        playlist = PlaylistManager.update(
+            PlaylistManager.get("id_a"), {"youtube_id": "$p"}
+        )
+        Registry.set("configuration", "youtube", "data", "quota_limit", 1000)
+        get_playlist_items.return_value = PlaylistItemFixture.get(1, video_id=["$x"])
+        create_playlist_items.return_value = [{}, ValueError("foo")]
+        remove_playlist_items.return_value = [ValueError("bar")]
+
+        self.assertFalse(Planner.sync(playlist))
+        self.assertIsNotNone(PlaylistManager.get("id_a").uploaded)
+
+        create_playlist_items.return_value = [ValueError("foo")] * 2
+        playlist = PlaylistManager.update(playlist, {"uploaded": None})
+        self.assertFalse(Planner.sync(playlist))
+        self.assertIsNone(PlaylistManager.get("id_a").uploaded)
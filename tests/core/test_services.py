@@ -1,13 +1,20 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from datetime import timedelta
+from datetime import timezone
 from unittest import mock
 
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.errors import HttpError
 
 from pytuber.core.models import ConfigManager
+from pytuber.core.services import QuotaBudget
 from pytuber.core.services import YouService
 from pytuber.exceptions import NotFound
+from pytuber.storage import Registry
+from tests.utils import ConfigFixture
 from tests.utils import PlaylistFixture
 from tests.utils import PlaylistItemFixture
 from tests.utils import TestCase
@@ -31,8 +38,11 @@ class YouServiceTests(TestCase):
         self.assertEqual("foo", YouService.authorize(path))
         from_secrets.assert_called_once_with(path, scopes=YouService.scopes)
 
+    @mock.patch("pytuber.core.services.time.time")
     @mock.patch.object(YouService, "get_client")
-    def test_search(self, get_client):
+    def test_search(self, get_client, time):
+        time.return_value = 1000
+        ConfigFixture.youtube()
         list = get_client.return_value.search.return_value.list
         list.return_value.execute.return_value = {
             "items": [{"id": {"kind": "youtube#video", "videoId": "101"}}]
@@ -42,15 +52,138 @@ class YouServiceTests(TestCase):
         self.assertEqual("101", YouService.search_track(track))
         list.assert_called_once_with(
             part="snippet",
+            fields="items(id(kind,videoId))",
             maxResults=1,
             q=f"{track.artist} {track.name}",
             type="video",
         )
         self.assertEqual(100, YouService.get_quota_usage())
 
+        expected = ["101", 1000 + timedelta(days=90).total_seconds()]
+        query = "artist_a name_a"
+        self.assertEqual(expected, Registry.get("youtube_search", query))
+
+        other = TrackFixture.one(id="b", artist=" ARTIST_a ", name="Name_A")
+        self.assertEqual("101", YouService.search_track(other))
+        self.assertEqual(1, list.call_count)
+
+        Registry.set("configuration", "youtube", "data", "search_ttl", 1)
+        time.return_value += timedelta(days=90, seconds=1).total_seconds()
+        list.return_value.execute.return_value = {}
+        self.assertIsNone(YouService.search_track(other))
+        self.assertEqual(2, list.call_count)
+        self.assertEqual(200, YouService.get_quota_usage())
+
+        self.assertFalse(Registry.exists("youtube_search", query))
+
+    @mock.patch.object(YouService, "find_video_id")
+    @mock.patch.object(YouService, "get_client")
+    def test_search_tracks(self, get_client, find_video_id):
+        ConfigFixture.youtube()
+        Registry.set("configuration", "youtube", "data", "quota_limit", 250)
+        YouService.update_quota(10)
+        tracks = TrackFixture.get(
+            5, artist=["a", "b", "c", "A", "d"], name=["x", "y", "z", "X", "w"]
+        )
+        Registry.set("youtube_search", "d w", ["103", time.time() + 10])
+        find_video_id.side_effect = lambda track: {"id_a": "101"}.get(track.id)
+
+        actual = YouService.search_tracks(tracks, jobs=2)
+        self.assertEqual(
+            [
+                (tracks[0], "101"),
+                (tracks[1], None),
+                (tracks[3], "101"),
+                (tracks[4], "103"),
+            ],
+            sorted(actual, key=lambda item: item[0].id),
+        )
+        find_video_id.assert_has_calls(
+            [mock.call(tracks[0]), mock.call(tracks[1])], any_order=True
+        )
+        self.assertEqual(2, find_video_id.call_count)
+        self.assertEqual(210, YouService.get_quota_usage())
+        self.assertEqual("101", Registry.get("youtube_search", "a x")[0])
+        get_client.assert_called_once_with()
+
+        self.assertEqual([], [*YouService.search_tracks([])])
+        self.assertEqual(1, get_client.call_count)
+
+        Registry.set("configuration", "youtube", "data", "quota_limit", 1000)
+        actual = [*YouService.search_tracks(tracks[4:], refresh=True)]
+        self.assertEqual([(tracks[4], None)], actual)
+        find_video_id.assert_called_with(tracks[4])
+
+    @mock.patch.object(YouService, "find_video_id")
+    @mock.patch.object(YouService, "get_client")
+    def test_search_tracks_retries_misses(self, get_client, find_video_id):
+        ConfigFixture.youtube()
+        Registry.set("configuration", "youtube", "data", "quota_limit", 1000)
+        track = TrackFixture.one(attempts=1, attempted=1)
+        query = YouService.search_query(track)
+        Registry.set("youtube_search", query, [None, time.time() + 60])
+        find_video_id.return_value = "101"
+
+        self.assertEqual([(track, "101")], [*YouService.search_tracks([track])])
+        find_video_id.assert_called_once_with(track)
+        self.assertEqual("101", Registry.get("youtube_search", query)[0])
+
+        find_video_id.return_value = None
+        self.assertEqual(
+            [(track, None)], [*YouService.search_tracks([track], refresh=True)]
+        )
+        self.assertFalse(Registry.exists("youtube_search", query))
+
+    @mock.patch.object(YouService, "find_video_id")
+    @mock.patch.object(YouService, "get_client")
+    def test_search_tracks_failure(self, get_client, find_video_id):
+        ConfigFixture.youtube()
+        Registry.set("configuration", "youtube", "data", "quota_limit", 1000)
+        tracks = TrackFixture.get(2)
+
+        def search(track):
+            if track.id == "id_a":
+                raise ValueError("quotaExceeded")
+            time.sleep(0.05)
+            return "102"
+
+        find_video_id.side_effect = search
+        with self.assertRaises(ValueError):
+            [*YouService.search_tracks(tracks, jobs=2)]
+
+        self.assertEqual(200, YouService.get_quota_usage())
+        self.assertEqual("102", Registry.get("youtube_search", "artist_b name_b")[0])
+        self.assertFalse(Registry.exists("youtube_search", "artist_a name_a"))
+
+    def test_sweep_searches(self):
+        Registry.set("youtube_search", "a", ["101", 10])
+        Registry.set("youtube_search", "b", [None, 30])
+
+        self.assertEqual(1, YouService.sweep_searches(now=20))
+        self.assertEqual(["b"], list(Registry.get("youtube_search")))
+        self.assertEqual(20, Registry.get("youtube_search_swept"))
+
+        self.assertEqual(0, YouService.sweep_searches(now=40))
+        self.assertEqual(["b"], list(Registry.get("youtube_search")))
+
+        day = timedelta(days=1).total_seconds()
+        self.assertEqual(1, YouService.sweep_searches(now=20 + day))
+        self.assertEqual({}, Registry.get("youtube_search"))
+
+    def test_quota_budget(self):
+        budget = QuotaBudget(limit=100, usage=10)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = [*executor.map(budget.reserve, [20] * 10)]
+
+        self.assertEqual(4, results.count(True))
+        self.assertEqual(90, budget.usage)
+        self.assertTrue(budget.reserve(10))
+        self.assertFalse(budget.reserve(1))
+
     @mock.patch.object(YouService, "get_client")
     def test_get_playlists(self, get_client):
         playlist = PlaylistFixture.one()
+        fields = "etag,nextPageToken,items(id,snippet(title,description))"
         list = get_client.return_value.playlists.return_value.list
         list.return_value.execute.side_effect = [
             {
@@ -74,9 +207,11 @@ class YouServiceTests(TestCase):
         self.assertEqual("One", actual[0].title)
         list.assert_has_calls(
             [
-                mock.call(part="snippet", mine=True, maxResults=2),
+                mock.call(part="snippet", fields=fields, mine=True, maxResults=2),
                 mock.call().execute(),
-                mock.call(part="snippet", mine=True, maxResults=2, pageToken=2),
+                mock.call(
+                    part="snippet", fields=fields, mine=True, maxResults=2, pageToken=2
+                ),
                 mock.call().execute(),
             ]
         )
@@ -95,12 +230,14 @@ class YouServiceTests(TestCase):
                 "status": {"privacyStatus": "private"},
             },
             part="snippet,status",
+            fields="id",
         )
         self.assertEqual(55, YouService.get_quota_usage())
 
     @mock.patch.object(YouService, "get_client")
     def test_get_playlist_items(self, get_client):
         playlist = PlaylistFixture.one()
+        fields = "etag,nextPageToken,items(id,snippet(title,resourceId/videoId))"
         list = get_client.return_value.playlistItems.return_value.list
         list.return_value.execute.side_effect = [
             {
@@ -108,13 +245,17 @@ class YouServiceTests(TestCase):
                 "items": [
                     {
                         "id": "a",
-                        "contentDetails": {"videoId": "va"},
-                        "snippet": {"title": "foo - bar"},
+                        "snippet": {
+                            "title": "foo - bar",
+                            "resourceId": {"videoId": "va"},
+                        },
                     },
                     {
                         "id": "b",
-                        "contentDetails": {"videoId": "vb"},
-                        "snippet": {"title": "thug life"},
+                        "snippet": {
+                            "title": "thug life",
+                            "resourceId": {"videoId": "vb"},
+                        },
                     },
                 ],
             },
@@ -122,8 +263,7 @@ class YouServiceTests(TestCase):
                 "items": [
                     {
                         "id": "c",
-                        "contentDetails": {"videoId": "vc"},
-                        "snippet": {"title": "a-b-c"},
+                        "snippet": {"title": "a-b-c", "resourceId": {"videoId": "vc"}},
                     }
                 ]
             },
@@ -140,13 +280,15 @@ class YouServiceTests(TestCase):
         list.assert_has_calls(
             [
                 mock.call(
-                    part="contentDetails,snippet",
+                    part="snippet",
+                    fields=fields,
                     maxResults=2,
                     playlistId=playlist.youtube_id,
                 ),
                 mock.call().execute(),
                 mock.call(
-                    part="contentDetails,snippet",
+                    part="snippet",
+                    fields=fields,
                     maxResults=2,
                     playlistId=playlist.youtube_id,
                     pageToken=3,
@@ -156,6 +298,52 @@ class YouServiceTests(TestCase):
         )
         self.assertEqual(10, YouService.get_quota_usage())
 
+    @mock.patch.object(YouService, "get_client")
+    def test_list_pages(self, get_client):
+        request = get_client.return_value.playlistItems.return_value.list
+        request.return_value.headers = {}
+        request.return_value.execute.side_effect = [
+            {"etag": "e1", "nextPageToken": "t", "items": [1]},
+            {"items": [2]},
+            HttpError(mock.Mock(status=304, reason="Not Modified"), b""),
+            {"etag": "e2", "items": [3]},
+        ]
+
+        params = {"playlistId": "p"}
+        actual = list(YouService.list_pages("playlistItems", params, 5))
+        self.assertEqual([[1], [2]], [page["items"] for page in actual])
+        self.assertEqual({}, request.return_value.headers)
+
+        actual = list(YouService.list_pages("playlistItems", params, 5))
+        self.assertEqual([[1], [3]], [page["items"] for page in actual])
+        self.assertEqual({"If-None-Match": "e1"}, request.return_value.headers)
+        request.assert_called_with(playlistId="p", pageToken="t")
+        self.assertEqual(
+            [
+                {"etag": "e1", "nextPageToken": "t", "items": [1]},
+                {"etag": "e2", "items": [3]},
+            ],
+            Registry.get(YouService.pages_key, "playlistItems?playlistId=p"),
+        )
+        self.assertEqual(
+            ["playlistItems?playlistId=p"], [*Registry.get("youtube_pages")]
+        )
+        self.assertEqual(20, YouService.get_quota_usage())
+
+        request.return_value.execute.side_effect = [{"etag": "e3", "items": [4]}]
+        actual = list(YouService.list_pages("playlistItems", params, 5))
+        self.assertEqual([[4]], [page["items"] for page in actual])
+        self.assertEqual(
+            [{"etag": "e3", "items": [4]}],
+            Registry.get(YouService.pages_key, "playlistItems?playlistId=p"),
+        )
+
+        request.return_value.execute.side_effect = [
+            HttpError(mock.Mock(status=500, reason="Error"), b"")
+        ]
+        with self.assertRaises(HttpError):
+            list(YouService.list_pages("playlistItems", params, 5))
+
     @mock.patch.object(YouService, "get_client")
     def test_create_playlist_item(self, get_client):
         playlist = PlaylistFixture.one(youtube_id="b")
@@ -171,9 +359,81 @@ class YouServiceTests(TestCase):
                 }
             },
             part="snippet",
+            fields="id",
         )
         self.assertEqual(53, YouService.get_quota_usage())
 
+    @mock.patch.object(YouService, "get_client")
+    def test_create_playlist_items(self, get_client):
+        playlist = PlaylistFixture.one(youtube_id="b")
+        insert = get_client.return_value.playlistItems.return_value.insert
+        insert.side_effect = ["r1", "r2", "r3"]
+
+        with mock.patch.object(YouService, "execute_batch") as execute_batch:
+            execute_batch.return_value = ["foo"] * 3
+            actual = YouService.create_playlist_items(
+                playlist, ["aa", "bb", "cc"], position=4
+            )
+
+        self.assertEqual(["foo"] * 3, actual)
+        execute_batch.assert_called_once_with(["r1", "r2", "r3"], cost=53)
+        insert.assert_has_calls(
+            [
+                mock.call(
+                    body={
+                        "snippet": {
+                            "playlistId": playlist.youtube_id,
+                            "resourceId": {"kind": "youtube#video", "videoId": vid},
+                            "position": position,
+                        }
+                    },
+                    part="snippet",
+                    fields="id",
+                )
+                for vid, position in [("aa", 4), ("bb", 5), ("cc", 6)]
+            ]
+        )
+
+    @mock.patch.object(YouService, "get_client")
+    def test_remove_playlist_items(self, get_client):
+        items = PlaylistItemFixture.get(2)
+        delete = get_client.return_value.playlistItems.return_value.delete
+        delete.side_effect = ["r1", "r2"]
+
+        with mock.patch.object(YouService, "execute_batch") as execute_batch:
+            execute_batch.return_value = ["foo", "bar"]
+            self.assertEqual(["foo", "bar"], YouService.remove_playlist_items(items))
+
+        execute_batch.assert_called_once_with(["r1", "r2"], cost=51)
+        delete.assert_has_calls([mock.call(id=items[0].id), mock.call(id=items[1].id)])
+
+    @mock.patch.object(YouService, "batch_size", new=2)
+    @mock.patch.object(YouService, "get_client")
+    def test_execute_batch(self, get_client):
+        batches = []
+        error = Exception("Oups")
+
+        def new_batch(callback):
+            batch = mock.Mock()
+            batch.execute.side_effect = lambda: [
+                (
+                    callback(kwargs["request_id"], f"{request}!", None)
+                    if request != "r2"
+                    else callback(kwargs["request_id"], None, error)
+                )
+                for (request,), kwargs in reversed(batch.add.call_args_list)
+            ]
+            batches.append(batch)
+            return batch
+
+        get_client.return_value.new_batch_http_request.side_effect = new_batch
+        actual = YouService.execute_batch(["r0", "r1", "r2", "r3", "r4"], cost=10)
+
+        self.assertEqual(["r0!", "r1!", error, "r3!", "r4!"], actual)
+        self.assertEqual([2, 2, 1], [batch.add.call_count for batch in batches])
+        batches[2].add.assert_called_once_with("r4", request_id="4")
+        self.assertEqual(50, YouService.get_quota_usage())
+
     @mock.patch.object(YouService, "get_client")
     def test_remove_playlist_item(self, get_client):
         item = PlaylistItemFixture.one()
@@ -184,21 +444,92 @@ class YouServiceTests(TestCase):
         delete.assert_called_once_with(id=item.id)
         self.assertEqual(51, YouService.get_quota_usage())
 
-    @mock.patch("pytuber.core.services.build")
+    @mock.patch("pytuber.core.services.get_static_doc")
+    @mock.patch("pytuber.core.services.build_from_document")
     @mock.patch.object(Credentials, "from_authorized_user_info")
-    def test_get_client(self, get_user_info, build):
+    def test_get_client(self, get_user_info, build, get_static_doc):
+        self.addCleanup(setattr, YouService, "credentials", None)
+        self.addCleanup(setattr, YouService, "discovery", None)
+        self.addCleanup(delattr, YouService.clients, "youtube")
         with self.assertRaises(NotFound):
             YouService.get_client()
 
-        ConfigManager.set(data={"provider": "youtube", "data": "foo"})
+        ConfigManager.set(
+            data={"provider": "youtube", "data": {"a": 1, "client_id": "c"}}
+        )
+        Registry.set(
+            YouService.token_key,
+            {"token": "t", "expiry": "e", "client_id": "c", "refresh_token": None},
+        )
         get_user_info.return_value = "creds"
+        get_static_doc.return_value = '{"doc": true}'
         build.return_value = "client"
 
         actual = YouService.get_client()
         self.assertEqual("client", actual)
 
-        get_user_info.assert_called_once_with("foo", scopes=YouService.scopes)
-        build.assert_called_once_with("youtube", "v3", credentials="creds")
+        get_user_info.assert_called_once_with(
+            {"a": 1, "client_id": "c", "token": "t", "expiry": "e"},
+            scopes=YouService.scopes,
+        )
+        get_static_doc.assert_called_once_with("youtube", "v3")
+        build.assert_called_once_with({"doc": True}, credentials="creds")
+
+        with ThreadPoolExecutor() as executor:
+            executor.submit(YouService.get_client).result()
+        self.assertEqual(2, build.call_count)
+        get_user_info.assert_called_once()
+        self.assertEqual(1, get_static_doc.call_count)
+
+    def test_get_token(self):
+        info = {"client_id": "c", "refresh_token": "r"}
+        self.assertEqual({}, YouService.get_token(info))
+
+        token = {"token": "t", "expiry": "e", "client_id": "c", "refresh_token": "r"}
+        Registry.set(YouService.token_key, token)
+        self.assertEqual({"token": "t", "expiry": "e"}, YouService.get_token(info))
+        self.assertEqual({}, YouService.get_token({**info, "client_id": "d"}))
+        self.assertEqual({}, YouService.get_token({**info, "refresh_token": "s"}))
+
+        Registry.set(YouService.token_key, {"token": "t", "expiry": "e"})
+        self.assertEqual({}, YouService.get_token(info))
+
+    def test_reset_credentials(self):
+        self.addCleanup(setattr, YouService, "credentials", None)
+        clients = YouService.clients
+        clients.youtube = "client"
+
+        YouService.reset_credentials("creds")
+        self.assertEqual("creds", YouService.credentials)
+        self.assertIsNot(clients, YouService.clients)
+        self.assertIsNone(getattr(YouService.clients, "youtube", None))
+
+    def test_save_token(self):
+        self.addCleanup(setattr, YouService, "credentials", None)
+        YouService.save_token()
+        self.assertIsNone(Registry.get(YouService.token_key, default=None))
+
+        YouService.credentials = Credentials(
+            token="t",
+            expiry=datetime(2019, 2, 17, 10, 30),
+            client_id="c",
+            refresh_token="r",
+        )
+        YouService.save_token()
+        expected = {
+            "token": "t",
+            "expiry": "2019-02-17T10:30:00",
+            "client_id": "c",
+            "refresh_token": "r",
+        }
+        self.assertEqual(expected, Registry.get(YouService.token_key))
+
+    @mock.patch.object(YouService, "quota_date")
+    def test_quota_reset(self, quota_date):
+        quota_date.return_value = datetime(2019, 2, 17, 23, 59)
+        expected = datetime(2019, 2, 18, 8, tzinfo=timezone.utc).timestamp()
+        self.assertEqual(expected, YouService.quota_reset())
+        quota_date.assert_called_once_with(obj=True)
 
     def test_quota_date(self):
         expected = (datetime.utcnow() - timedelta(hours=8)).strftime("%Y%m%d")
@@ -24,21 +24,28 @@ class CommandFetchTests(CommandTestCase):
         abort.assert_called_once_with()
         self.assertEqual(1, secho.call_count)
 
-    @mock.patch.object(TrackManager, "set")
+    @mock.patch.object(TrackManager, "set_many")
     @mock.patch.object(LastService, "get_tags")
     @mock.patch.object(LastService, "get_tracks")
     @mock.patch.object(PlaylistManager, "update")
     @mock.patch.object(PlaylistManager, "find")
-    def test_with_tracks(self, find, update, get_tracks, get_tags, set):
+    def test_with_tracks(self, find, update, get_tracks, get_tags, set_many):
 
         tracks = TrackFixture.get(6)
+        items = []
         playlists = PlaylistFixture.get(2)
         last_tracks = [
             pydrag.Track.from_dict({"name": track.name, "artist": track.artist})
             for track in tracks
         ]
 
-        set.side_effect = tracks
+        def save(data):
+            items.append(list(data))
+            ids = [track.id for track in tracks[len(items) * 3 - 3 : len(items) * 3]]
+            return ids + ids[:1]
+
+        set_many.side_effect = save
+        update.side_effect = lambda playlist, data: playlist
         find.return_value = playlists
         get_tracks.side_effect = [
             [last_tracks[0], last_tracks[1], last_tracks[2]],
@@ -53,15 +60,20 @@ class CommandFetchTests(CommandTestCase):
         get_tracks.assert_has_calls(
             [mock.call(a=0, type="type_a"), mock.call(b=1, type="type_b")]
         )
-        set.assert_has_calls(
+        self.assertEqual(
             [
-                mock.call({"artist": "artist_a", "name": "name_a"}),
-                mock.call({"artist": "artist_b", "name": "name_b"}),
-                mock.call({"artist": "artist_c", "name": "name_c"}),
-                mock.call({"artist": "artist_d", "name": "name_d"}),
-                mock.call({"artist": "artist_e", "name": "name_e"}),
-                mock.call({"artist": "artist_f", "name": "name_f"}),
-            ]
+                [
+                    {"artist": "artist_a", "name": "name_a"},
+                    {"artist": "artist_b", "name": "name_b"},
+                    {"artist": "artist_c", "name": "name_c"},
+                ],
+                [
+                    {"artist": "artist_d", "name": "name_d"},
+                    {"artist": "artist_e", "name": "name_e"},
+                    {"artist": "artist_f", "name": "name_f"},
+                ],
+            ],
+            items,
         )
 
         update.assert_has_calls(
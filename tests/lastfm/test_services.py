@@ -166,7 +166,7 @@ class LastServiceTests(TestCase):
             ]
         )
 
-        tags, ttl = Registry.get("last.fm_tag_list")
+        tags, ttl = Registry.get("cache", "last.fm_tag_list")
         self.assertEqual(1000, len(tags))
         self.assertEqual({"name": 0}, tags[0])
         self.assertEqual(timedelta(days=30, seconds=1).total_seconds(), ttl)
@@ -185,7 +185,7 @@ class LastServiceTests(TestCase):
 
         find.assert_called_once_with("quueee")
 
-        artist, ttl = Registry.get("last.fm_artist_quueee")
+        artist, ttl = Registry.get("cache", "last.fm_artist_quueee")
         self.assertEqual({"name": "Queen"}, artist)
 
         self.assertEqual(timedelta(days=30, seconds=1).total_seconds(), ttl)
@@ -203,7 +203,7 @@ class LastServiceTests(TestCase):
 
         find.assert_called_once_with("rj")
 
-        user, ttl = Registry.get("last.fm_user_rj")
+        user, ttl = Registry.get("cache", "last.fm_user_rj")
         self.assertEqual(self.get_user().to_dict(), user)
 
         self.assertEqual(timedelta(hours=24, seconds=1).total_seconds(), ttl)
@@ -0,0 +1,132 @@
+import os
+from unittest import mock
+
+import click
+
+from pytuber.api import PlaylistSync
+from pytuber.api import Session
+from pytuber.core.models import PlaylistIndex
+from pytuber.core.models import PlaylistManager
+from pytuber.core.models import Provider
+from pytuber.core.models import TrackManager
+from pytuber.core.services import YouService
+from pytuber.storage import Registry
+from tests.utils import PlaylistFixture
+from tests.utils import PlaylistItemFixture
+from tests.utils import TestCase
+from tests.utils import TrackFixture
+
+
+class SessionTests(TestCase):
+    def test_init(self):
+        session = Session()
+        appdir = click.get_app_dir("pytuber", False)
+        self.assertEqual(os.path.join(appdir, "storage.db"), session.path)
+        self.assertIsNotNone(Registry().database)
+        self.assertIs(YouService, session.youtube)
+
+    def test_init_with_another_storage(self):
+        session = Session()
+        self.assertIsInstance(Session(session.path), Session)
+
+        path = os.path.join(os.path.dirname(session.path), "other.db")
+        with self.assertRaises(ValueError) as cm:
+            Session(path)
+
+        self.assertEqual(
+            f"The registry is already attached to {session.path}", str(cm.exception)
+        )
+        self.assertFalse(os.path.exists(path))
+
+    def test_current(self):
+        session = Session.current()
+        self.assertIsInstance(session, Session)
+
+        with click.Context(click.Command("foo"), obj=session) as ctx:
+            self.assertIs(session, Session.current())
+            self.assertIs(session, ctx.obj)
+
+    def test_close(self):
+        with Session() as session:
+            playlist = session.create_playlist(
+                " foo ", [("a", "b"), ("c", "d")], "editor", {"_title": "foo"}
+            )
+
+        self.assertEqual("foo", playlist.title)
+        self.assertEqual(str(Provider.user), playlist.provider)
+        self.assertEqual(2, len(TrackManager.get_many(playlist.tracks)))
+
+        path = os.path.join(os.path.dirname(session.path), PlaylistIndex.filename)
+        self.assertTrue(os.path.isfile(path))
+        self.assertEqual([playlist], session.playlists(type="editor"))
+        self.assertTrue(Registry.exists("youtube_search_swept"))
+
+    @mock.patch.object(YouService, "create_playlist")
+    def test_push_playlists(self, create_playlist):
+        for playlist in PlaylistFixture.get(2, youtube_id=[None, "y2"]):
+            PlaylistManager.set(playlist.asdict())
+        create_playlist.return_value = "y1"
+
+        actual = Session().push_playlists()
+        create_playlist.assert_not_called()
+
+        self.assertEqual(["y1"], [playlist.youtube_id for playlist in actual])
+        self.assertEqual("y1", PlaylistManager.get("id_a").youtube_id)
+
+    @mock.patch("pytuber.api.timestamp")
+    @mock.patch.object(YouService, "remove_playlist_items")
+    @mock.patch.object(YouService, "create_playlist_items")
+    @mock.patch.object(YouService, "get_playlist_items")
+    def test_push_tracks(
+        self, get_playlist_items, create_playlist_items, remove_playlist_items, ts
+    ):
+        ts.return_value = 101
+        for track in TrackFixture.get(3, youtube_id=["$a", "$b", "$c"]):
+            TrackManager.set(track.asdict())
+        playlist = PlaylistFixture.one(youtube_id="y1", tracks=["id_a", "id_b", "id_c"])
+        PlaylistManager.set(playlist.asdict())
+
+        items = PlaylistItemFixture.get(2, video_id=["$a", "$d"])
+        get_playlist_items.return_value = items
+        error = Exception("Oups")
+        create_playlist_items.return_value = [{}, error]
+        remove_playlist_items.return_value = [{}]
+
+        actual = list(Session().push_tracks())
+
+        expected = [
+            PlaylistSync(PlaylistManager.get("id_a"), ["$b"], ["$d"], [("$c", error)])
+        ]
+        self.assertEqual(expected, actual)
+        self.assertEqual(101, actual[0].playlist.uploaded)
+        create_playlist_items.assert_called_once_with(
+            playlist, ["$b", "$c"], position=2
+        )
+        remove_playlist_items.assert_called_once_with([items[1]])
+
+    @mock.patch.object(YouService, "remove_playlist_items")
+    @mock.patch.object(YouService, "create_playlist_items")
+    @mock.patch.object(YouService, "get_playlist_items")
+    def test_push_tracks_with_playlist_error(
+        self, get_playlist_items, create_playlist_items, remove_playlist_items
+    ):
+        TrackManager.set(TrackFixture.one(youtube_id="$a").asdict())
+        playlists = PlaylistFixture.get(
+            2, youtube_id=["y1", "y2"], tracks=[["id_a"], ["id_a"]]
+        )
+        for playlist in playlists:
+            PlaylistManager.set(playlist.asdict())
+
+        error = Exception("Oups")
+        get_playlist_items.side_effect = [error, []]
+        create_playlist_items.return_value = [{}]
+        remove_playlist_items.return_value = []
+
+        one, two = Session().push_tracks()
+
+        self.assertEqual(PlaylistSync(one.playlist, [], [], [], error), one)
+        self.assertIsNone(one.playlist.uploaded)
+        self.assertEqual(["$a"], two.added)
+        self.assertIsNone(two.error)
+        self.assertEqual(2, get_playlist_items.call_count)
+        create_playlist_items.assert_called_once_with(playlists[1], ["$a"], position=0)
@@ -0,0 +1,90 @@
+import os
+import subprocess
+import sys
+from unittest import mock
+
+import click
+
+from pytuber.cli import cli
+from pytuber.core.models import PlaylistIndex
+from pytuber.core.models import PlaylistManager
+from pytuber.daemon import Daemon
+from tests.utils import CommandTestCase
+from tests.utils import PlaylistFixture
+
+IMPORT_SCRIPT = """
+import sys
+import time
+
+start = time.perf_counter()
+from pytuber.cli import cli
+
+imported = ",".join(sys.modules)
+cli.get_command(None, "list")
+print(time.perf_counter() - start)
+print(imported)
+print(",".join(sys.modules))
+"""
+
+
+class CliTests(CommandTestCase):
+    def test_lazy_commands(self):
+        self.assertEqual(
+            ["add", "batch", "clean", "daemon", "fetch", "list"],
+            cli.list_commands(None)[:6],
+        )
+        setup = cli.get_command(None, "setup")
+        self.assertEqual("youtube", setup.get_command(None, "youtube").name)
+        self.assertIsNone(setup.get_command(None, "foo"))
+
+    def test_import_time(self):
+        env = {k: v for k, v in os.environ.items() if k != "_PYTUBER_COMPLETE"}
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_SCRIPT],
+            env=env,
+            check=True,
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+        ).stdout
+        elapsed, imported, modules = output.strip().split("\n")
+        imported = imported.split(",")
+        modules = modules.split(",")
+
+        heavy = (
+            "click_completion",
+            "google_auth_oauthlib",
+            "googleapiclient",
+            "lxml",
+            "pydrag",
+            "pytuber.core.services",
+        )
+        self.assertEqual([], [name for name in heavy if name in modules])
+
+        heavy += ("tabulate", "yaspin")
+        self.assertEqual([], [name for name in heavy if name in imported])
+        self.assertLess(float(elapsed), 1.0)
+
+    def test_playlist_index(self):
+        path = os.path.join(click.get_app_dir("pytuber"), PlaylistIndex.filename)
+        self.runner.invoke(cli, ["list"], catch_exceptions=False)
+        self.assertFalse(os.path.exists(path))
+
+        PlaylistManager.set(PlaylistFixture.one().asdict())
+        self.runner.invoke(cli, ["list"], catch_exceptions=False)
+        self.assertEqual({"id_a": "title_a"}, PlaylistIndex.read(path)["titles"])
+
+    @mock.patch.object(Daemon, "forward")
+    def test_forward_to_daemon(self, forward):
+        forward.return_value = 3
+        result = self.runner.invoke(cli, ["list"])
+        self.assertEqual(3, result.exit_code)
+        self.assertEqual("", result.output)
+        forward.assert_called_once_with(["list"])
+
+        forward.return_value = None
+        result = self.runner.invoke(cli, ["list"])
+        self.assertEqual(0, result.exit_code)
+        self.assertIn("No playlists found", result.output)
+
+        self.runner.invoke(cli, ["daemon", "--stop"])
+        self.assertEqual(2, forward.call_count)
@@ -0,0 +1,133 @@
+import json
+import os
+import socket
+import stat
+import threading
+import time
+from unittest import mock
+
+from pytuber.cli import cli
+from pytuber.core.services import YouService
+from pytuber.core.models import PlaylistManager
+from pytuber.daemon import Channel
+from pytuber.daemon import Daemon
+from pytuber.storage import Database
+from pytuber.storage import Registry
+from tests.utils import PlaylistFixture
+from tests.utils import TestCase
+
+
+class DaemonTests(TestCase):
+    def receive(self, conn):
+        conn.shutdown(socket.SHUT_WR)
+        data = b""
+        while True:
+            chunk = conn.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+        return [json.loads(line) for line in data.splitlines()]
+
+    def test_forwards(self):
+        self.assertTrue(Daemon.forwards(["list"]))
+        self.assertTrue(Daemon.forwards(["add", "file", "foo.m3u"]))
+        self.assertTrue(Daemon.forwards(["fetch", "--jobs", 2, "youtube"]))
+        self.assertFalse(Daemon.forwards(["daemon", "--stop"]))
+        self.assertFalse(Daemon.forwards(["batch", "nightly.txt"]))
+        self.assertFalse(Daemon.forwards(["setup", "youtube", "foo.json"]))
+        self.assertFalse(Daemon.forwards(["add", "editor", "--title", "foo"]))
+
+        with mock.patch.dict(os.environ, {"_PYTUBER_COMPLETE": "complete"}):
+            self.assertFalse(Daemon.forwards(["list"]))
+
+        with mock.patch.object(Daemon, "serving", True):
+            self.assertFalse(Daemon.forwards(["list"]))
+
+    def test_forward_without_daemon(self):
+        self.assertIsNone(Daemon.forward(["list"]))
+        self.assertFalse(Daemon.stop())
+
+    def test_handle(self):
+        PlaylistManager.set(PlaylistFixture.one().asdict())
+        client, server = socket.socketpair()
+        client.sendall(b'{"input": "y\\n"}\n')
+
+        request = {"args": ["remove", "id_a"], "cwd": os.getcwd(), "tty": False}
+        channel = Channel(server)
+        Daemon.handle(cli, channel, request, 0)
+        channel.close()
+
+        messages = self.receive(client)
+        self.assertEqual({"read": True}, messages[1])
+        self.assertEqual({"exit": 0}, messages[-1])
+        output = "".join(message.get("out", "") for message in messages)
+        self.assertEqual(
+            "Do you want to continue? [y/N]: Removed playlist: id_a!\n", output
+        )
+        self.assertEqual([], PlaylistManager.keys())
+
+    def test_handle_errors(self):
+        client, server = socket.socketpair()
+        request = {"args": ["show", "foo"], "tty": False}
+        channel = Channel(server)
+        Daemon.handle(cli, channel, request, 0)
+        channel.close()
+
+        messages = self.receive(client)
+        self.assertEqual({"exit": 2}, messages[-1])
+        error = "".join(message.get("err", "") for message in messages)
+        self.assertIn("Error: No playlist matched your argument: foo!", error)
+
+    @mock.patch.object(YouService, "reset_credentials")
+    @mock.patch.object(Daemon, "data_version")
+    def test_handle_reloads_changed_storage(self, data_version, reset_credentials):
+        path = os.path.join(os.path.dirname(Daemon.path()), "foo.db")
+        Registry.from_file(path)
+        Registry.set("foo", "bar")
+        data_version.side_effect = [1, 2, 2, 2, 2, 2]
+
+        client, server = socket.socketpair()
+        channel = Channel(server)
+        request = {"args": ["--help"]}
+        self.assertEqual(2, Daemon.handle(cli, channel, request, 1))
+        self.assertEqual("bar", Registry.get("foo"))
+
+        database = Database(path)
+        database.write(Database.root, "foo", "baz")
+        database.connection.commit()
+        self.assertEqual(2, Daemon.handle(cli, channel, request, 1))
+        self.assertEqual("baz", Registry.get("foo"))
+        self.assertEqual(path, Registry().database.path)
+        reset_credentials.assert_not_called()
+
+        database.write(Database.root, YouService.token_key, {"token": "t"})
+        database.connection.commit()
+        self.assertEqual(2, Daemon.handle(cli, channel, request, 1))
+        reset_credentials.assert_called_once_with()
+
+        database.close()
+        channel.close()
+        client.close()
+
+    @mock.patch.object(Daemon, "handle")
+    def test_serve(self, handle):
+        handle.side_effect = lambda command, channel, request, version: (
+            channel.send(exit=len(request["args"])) or version
+        )
+        thread = threading.Thread(target=Daemon.serve, args=(cli,))
+        thread.start()
+        self.addCleanup(thread.join)
+        while not os.path.exists(Daemon.path()):
+            time.sleep(0.01)
+
+        self.assertEqual(3, Daemon.forward(["fetch", "--jobs", 4]))
+        command, channel, request, version = handle.call_args[0]
+        self.assertEqual(cli, command)
+        self.assertEqual(["fetch", "--jobs", "4"], request["args"])
+        self.assertEqual(os.getcwd(), request["cwd"])
+        self.assertEqual(0o600, stat.S_IMODE(os.stat(Daemon.path()).st_mode))
+
+        self.assertTrue(Daemon.stop())
+        thread.join()
+        self.assertFalse(os.path.exists(Daemon.path()))
+        self.assertFalse(Daemon.serving)
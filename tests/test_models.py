@@ -1,23 +1,30 @@
 import base64
 import json
+import os
 from dataclasses import dataclass
 from dataclasses import field
 from datetime import datetime
 from typing import Optional
+from unittest import mock
+
+import click
 
 from pytuber.core.models import Config
 from pytuber.core.models import ConfigManager
 from pytuber.core.models import Document
 from pytuber.core.models import Manager
 from pytuber.core.models import Playlist
+from pytuber.core.models import PlaylistIndex
 from pytuber.core.models import PlaylistManager
 from pytuber.core.models import PlaylistType
 from pytuber.core.models import Provider
+from pytuber.core.models import References
 from pytuber.core.models import StrEnum
 from pytuber.core.models import Track
 from pytuber.core.models import TrackManager
 from pytuber.exceptions import NotFound
 from pytuber.storage import Registry
+from pytuber.storage import Table
 from tests.utils import PlaylistFixture
 from tests.utils import TestCase
 from tests.utils import TrackFixture
@@ -59,6 +66,15 @@ class TrackTests(TestCase):
         track = TrackFixture.one(id=None)
         self.assertEqual("6784d47", track.id)
 
+    def test_slug(self):
+        self.assertEqual(
+            "queenbohemianrhapsody", Track.slug("Queen", "Bohemian_Rhapsody!")
+        )
+        self.assertEqual(
+            Track(artist="AC/DC", name="T.N.T.").id,
+            Track(artist="ac dc", name="tnt").id,
+        )
+
 
 class ProviderTests(TestCase):
     def test_youtube(self):
@@ -83,6 +99,13 @@ class FooManager(Manager):
     model = Foo
 
 
+class IndexedFooManager(Manager):
+    namespace = "indexed_foo"
+    key = "id"
+    model = Foo
+    indexes = ("keeper",)
+
+
 class ManagerTests(TestCase):
     data = {"id": "a", "value": 1, "keeper": "keep"}
 
@@ -108,6 +131,32 @@ class ManagerTests(TestCase):
         thug = FooManager.set({"id": "a", "value": 1, "keeper": "peek"})
         self.assertEqual("peek", thug.keeper)
 
+    def test_get_many(self):
+        a = FooManager.set({"id": "a", "value": 1})
+        b = FooManager.set({"id": "b", "value": 2})
+
+        self.assertEqual([b, a, b], FooManager.get_many(["b", "x", "a", "b"]))
+        self.assertEqual([], FooManager.get_many([]))
+        self.assertEqual([], IndexedFooManager.get_many(["a"]))
+
+    def test_set_many(self):
+        FooManager.set({"id": "a", "value": 1, "keeper": "peek"})
+        items = (
+            {"id": key, "value": value} for key, value in [("b", 2), ("a", 3), ("b", 4)]
+        )
+
+        with mock.patch.object(
+            Registry, "transaction", wraps=Registry.transaction
+        ) as transaction:
+            self.assertEqual(["b", "a", "b"], FooManager.set_many(items))
+            transaction.assert_called_once_with()
+
+        expected = {
+            "a": {"id": "a", "value": 3, "keeper": "peek"},
+            "b": {"id": "b", "value": 4, "keeper": None},
+        }
+        self.assertEqual(expected, Registry.get("foo"))
+
     def test_update(self):
         foo = FooManager.set(self.data)
         new_foo = FooManager.update(foo, {"value": 2})
@@ -140,6 +189,52 @@ class ManagerTests(TestCase):
         self.assertEqual([e], FooManager.find(value=None))
         self.assertEqual([a, d], FooManager.find(value=lambda x: x == 1))
 
+    def test_find_with_indexes(self):
+        Registry.from_file(os.path.join(click.get_app_dir("pytuber"), "storage.db"))
+
+        a = IndexedFooManager.set({"id": "a", "value": 1, "keeper": "x"})
+        b = IndexedFooManager.set({"id": "b", "value": 2, "keeper": "y"})
+        c = IndexedFooManager.set({"id": "c", "value": 2})
+        Registry()["indexed_foo"].loaded = False
+
+        with mock.patch.object(Table, "load") as load:
+            self.assertEqual([a], IndexedFooManager.find(keeper="x"))
+            self.assertEqual([c], IndexedFooManager.find(keeper=None))
+            self.assertEqual([b], IndexedFooManager.find(keeper="y", value=2))
+            self.assertEqual([b], IndexedFooManager.find(keeper="y", id="b"))
+            self.assertEqual([], IndexedFooManager.find(keeper="x", id="b"))
+            self.assertEqual(0, load.call_count)
+
+            c = IndexedFooManager.update(c, {"keeper": "x"})
+            self.assertEqual([a, c], IndexedFooManager.find(keeper="x"))
+            self.assertEqual([], IndexedFooManager.find(keeper=None))
+
+            IndexedFooManager.remove("a")
+            self.assertEqual([c], IndexedFooManager.find(keeper="x"))
+            self.assertEqual(0, load.call_count)
+
+        self.assertEqual([b, c], IndexedFooManager.find(keeper=lambda x: x))
+
+    def test_find_reads_the_matches_at_once(self):
+        path = os.path.join(click.get_app_dir("pytuber"), "storage.db")
+        Registry.from_file(path)
+        a = IndexedFooManager.set({"id": "a", "value": 1, "keeper": "x"})
+        IndexedFooManager.set({"id": "b", "value": 2, "keeper": "y"})
+        c = IndexedFooManager.set({"id": "c", "value": 3, "keeper": "x"})
+        Registry.persist(path)
+        Registry().clear()
+        Registry.from_file(path)
+
+        database = Registry().database
+        with mock.patch.object(database, "read", wraps=database.read) as read:
+            with mock.patch.object(
+                database, "read_many", wraps=database.read_many
+            ) as read_many:
+                self.assertEqual([a, c], IndexedFooManager.find(keeper="x"))
+
+        self.assertEqual(0, read.call_count)
+        read_many.assert_called_once_with("indexed_foo", ["a", "c"])
+
     def test_exists(self):
         a = Foo(id="a", value=1)
         self.assertFalse(FooManager.exists(a))
@@ -175,6 +270,66 @@ class PlaylistManagerTests(TestCase):
         )
 
 
+class PlaylistIndexTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(click.get_app_dir("pytuber"), "playlists.idx")
+
+    def test_write_and_read(self):
+        PlaylistManager.set_many(
+            p.asdict()
+            for p in PlaylistFixture.get(2, title=["Top Rock", "Classic Rock Hits"])
+        )
+        PlaylistIndex.write(self.path)
+
+        expected = {
+            "titles": {"id_a": "Top Rock", "id_b": "Classic Rock Hits"},
+            "words": [
+                ["classic rock hits", "id_b"],
+                ["hits", "id_b"],
+                ["rock", "id_a"],
+                ["rock hits", "id_b"],
+                ["top rock", "id_a"],
+            ],
+        }
+        self.assertEqual(expected, PlaylistIndex.read(self.path))
+        self.assertFalse(os.path.exists(f"{self.path}.tmp"))
+
+        with open(self.path, "w") as fp:
+            fp.write("{")
+        self.assertIsNone(PlaylistIndex.read(self.path))
+        self.assertIsNone(PlaylistIndex.read(f"{self.path}.foo"))
+
+    def test_complete(self):
+        titles = {f"id_{i:04}": f"Playlist {i}" for i in range(5000)}
+        titles.update({"ab1": "Top Rock", "ab2": "Rock Classics"})
+        index = {
+            "titles": dict(sorted(titles.items())),
+            "words": sorted(
+                [word, key]
+                for key, title in titles.items()
+                for word in PlaylistIndex.suffixes(title)
+            ),
+        }
+
+        self.assertEqual(
+            [("ab1", "Top Rock"), ("ab2", "Rock Classics")],
+            PlaylistIndex.complete(index, "A"),
+        )
+        self.assertEqual(
+            [("ab1", "Top Rock"), ("ab2", "Rock Classics")],
+            PlaylistIndex.complete(index, "ro"),
+        )
+        self.assertEqual(
+            [("id_0420", "Playlist 420")], PlaylistIndex.complete(index, "id_0420")
+        )
+        self.assertEqual(
+            [("id_4999", "Playlist 4999")],
+            PlaylistIndex.complete(index, "playlist 4999"),
+        )
+        self.assertEqual([], PlaylistIndex.complete(index, "zz"))
+
+
 class TrackManagerTests(TestCase):
     def test_class(self):
         self.assertTrue(issubclass(TrackManager, Manager))
@@ -187,6 +342,114 @@ class TrackManagerTests(TestCase):
         self.assertEqual(1, TrackManager.find_youtube_id("a"))
         self.assertIsNone(TrackManager.find_youtube_id("b"))
 
+    @mock.patch("pytuber.core.models.timestamp")
+    def test_find_unmatched(self, timestamp):
+        day = 86400
+        timestamp.return_value = 100 * day
+        a, b, c, d = TrackFixture.get(
+            4,
+            youtube_id=[None, None, None, "y"],
+            attempts=[0, 1, 3, 0],
+            attempted=[None, 99 * day, 97 * day, None],
+        )
+        for track in (a, b, c, d):
+            TrackManager.set(track.asdict())
+
+        self.assertEqual(0, TrackManager.next_attempt(a))
+        self.assertEqual(100 * day, TrackManager.next_attempt(b))
+        self.assertEqual(101 * day, TrackManager.next_attempt(c))
+        self.assertEqual([a, b], TrackManager.find_unmatched())
+        self.assertEqual([a, b, c], TrackManager.find_unmatched(retry=True))
+
+        c.attempts = 10
+        self.assertEqual(161 * day, TrackManager.next_attempt(c))
+
+    @mock.patch("pytuber.core.models.timestamp")
+    def test_set_youtube_id(self, timestamp):
+        timestamp.return_value = 101
+        track = TrackManager.set(TrackFixture.one().asdict())
+
+        track = TrackManager.set_youtube_id(track, None)
+        track = TrackManager.set_youtube_id(track, None)
+        self.assertEqual(
+            (None, 2, 101), (track.youtube_id, track.attempts, track.attempted)
+        )
+
+        TrackManager.set(TrackFixture.one().asdict())
+        self.assertEqual(2, TrackManager.get(track.id).attempts)
+
+        track = TrackManager.set_youtube_id(track, "y")
+        self.assertEqual(
+            ("y", 0, None), (track.youtube_id, track.attempts, track.attempted)
+        )
+        self.assertEqual(track, TrackManager.get(track.id))
+
+
+class ReferencesTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        [TrackManager.set(t.asdict()) for t in TrackFixture.get(4)]
+
+    def test_playlist_changes_update_references(self):
+        self.assertEqual(["id_a", "id_b", "id_c", "id_d"], list(Registry.get("orphan")))
+
+        one = PlaylistManager.set(PlaylistFixture.one(tracks=["id_a", "id_b"]).asdict())
+        two = PlaylistManager.set(
+            PlaylistFixture.one(num=1, tracks=["id_b", "id_c"]).asdict()
+        )
+        self.assertEqual(["id_a"], References.get("id_a"))
+        self.assertEqual(["id_a", "id_b"], References.get("id_b"))
+        self.assertEqual(["id_d"], list(Registry.get("orphan").keys()))
+
+        PlaylistManager.update(two, {"tracks": ["id_c", "id_d"]})
+        self.assertEqual(["id_a"], References.get("id_b"))
+        self.assertEqual(["id_b"], References.get("id_d"))
+        self.assertEqual([], list(Registry.get("orphan").keys()))
+
+        PlaylistManager.remove(one.id)
+        self.assertEqual([], References.get("id_a"))
+        self.assertEqual(["id_a", "id_b"], list(Registry.get("orphan").keys()))
+
+        self.assertEqual(2, References.collect())
+        self.assertEqual(["id_c", "id_d"], TrackManager.keys())
+        self.assertEqual([], list(Registry.get("orphan").keys()))
+
+    def test_remove_with_gc(self):
+        PlaylistManager.set(PlaylistFixture.one(tracks=["id_a", "id_b"]).asdict())
+        PlaylistManager.set(PlaylistFixture.one(num=1, tracks=["id_b"]).asdict())
+
+        PlaylistManager.remove("id_a", gc=True)
+        self.assertEqual(["id_b", "id_c", "id_d"], TrackManager.keys())
+        self.assertEqual(["id_c", "id_d"], list(Registry.get("orphan").keys()))
+
+    def test_single_transaction(self):
+        Registry.from_file(os.path.join(click.get_app_dir("pytuber"), "storage.db"))
+        tracks = [f"id_{i}" for i in range(100)]
+        TrackManager.set_many({"artist": id, "name": id, "id": id} for id in tracks)
+
+        statements: list = []
+        Registry().database.connection.set_trace_callback(statements.append)
+        playlist = PlaylistManager.set(PlaylistFixture.one(tracks=tracks).asdict())
+        self.assertEqual(1, statements.count("COMMIT"))
+
+        statements.clear()
+        PlaylistManager.update(playlist, {"tracks": tracks[50:]})
+        self.assertEqual(1, statements.count("COMMIT"))
+
+        statements.clear()
+        PlaylistManager.remove(playlist.id, gc=True)
+        self.assertEqual(1, statements.count("COMMIT"))
+        remaining = [track.id for track in TrackManager.get_many(tracks)]
+        self.assertEqual(tracks[:50], remaining)
+
+    def test_rebuild(self):
+        PlaylistManager.set(PlaylistFixture.one(tracks=["id_a", "id_b"]).asdict())
+        Registry.remove("reference")
+        Registry.remove("orphan")
+
+        self.assertEqual(["id_a"], References.get("id_b"))
+        self.assertEqual(["id_c", "id_d"], list(Registry.get("orphan").keys()))
+
 
 class PlaylistTypeTests(TestCase):
     def test_enum(self):
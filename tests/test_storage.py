@@ -1,12 +1,17 @@
 import json
 import os
 import shutil
+import sqlite3
 import tempfile
+import threading
+import time
 from datetime import timedelta
 from unittest import mock
 from unittest import TestCase
 
+from pytuber.storage import Database
 from pytuber.storage import Registry
+from pytuber.storage import Table
 
 
 class RegistryTests(TestCase):
@@ -76,13 +81,13 @@ class RegistryTests(TestCase):
 
             Registry.from_file(file_path)
 
-            self.assertEqual({"1": {"2": {"3": 4}}}, Registry())
+            self.assertEqual({"1": {"2": {"3": 5}}}, Registry())
         finally:
             shutil.rmtree(tmp)
 
     @mock.patch("pytuber.storage.time.time")
     def test_cache(self, time):
-        time.side_effect = [10, 20.1, 20.1, 20.5, 20.8]
+        time.side_effect = [10, 20.1, 20.5, 20.8]
 
         def callme(ttl, value, refresh=False):
             return Registry.cache(
@@ -93,15 +98,413 @@ class RegistryTests(TestCase):
             )
 
         self.assertEqual("first", callme(10, "first"))
-        self.assertEqual(("first", 20.0), Registry.get("foo"))
+        self.assertEqual(("first", 20.0), Registry.get("cache", "foo"))
 
         self.assertEqual("second", callme(1, "second"))
-        self.assertEqual(("second", 21.1), Registry.get("foo"))
+        self.assertEqual(("second", 21.1), Registry.get("cache", "foo"))
 
         self.assertEqual("second", callme(1, "third"))
-        self.assertEqual(("second", 21.1), Registry.get("foo"))
+        self.assertEqual(("second", 21.1), Registry.get("cache", "foo"))
 
         self.assertEqual("third", callme(100, "third", refresh=True))
-        self.assertEqual(("third", 120.8), Registry.get("foo"))
+        self.assertEqual(("third", 120.8), Registry.get("cache", "foo"))
 
-        self.assertEqual(5, time.call_count)
+        self.assertEqual(4, time.call_count)
+        self.assertEqual([120.8, 20.8, 16], Registry.get("cache_index", "foo"))
+        self.assertEqual((1, 3, 1, 16), Registry.cache_info()[:4])
+
+    @mock.patch("pytuber.storage.time.time")
+    def test_cache_eviction(self, time):
+        def callme(key, ttl=10):
+            return Registry.cache(
+                key=key, ttl=timedelta(seconds=ttl), func=lambda: key * 4
+            )
+
+        time.side_effect = range(100)
+        with mock.patch.object(Registry, "cache_max_entries", new=3):
+            for key in "abc":
+                callme(key)
+            callme("a")
+            callme("d")
+
+        self.assertEqual(["a", "c", "d"], sorted(Registry.get("cache")))
+        self.assertEqual(["a", "c", "d"], sorted(Registry.get("cache_index")))
+
+        with mock.patch.object(Registry, "cache_max_size", new=42):
+            callme("e")
+
+        self.assertEqual(["a", "d", "e"], sorted(Registry.get("cache")))
+        self.assertEqual((1, 5, 3, 42), Registry.cache_info()[:4])
+
+    @mock.patch("pytuber.storage.time.time")
+    def test_cache_revalidate(self, time):
+        def callme(value):
+            return Registry.cache(
+                key="foo",
+                ttl=timedelta(seconds=10),
+                func=lambda: value,
+                stale=timedelta(seconds=5),
+                ahead=timedelta(seconds=2),
+            )
+
+        time.side_effect = [0, 5, 9, 10, 11, 13, 30, 60]
+        self.assertEqual("first", callme("first"))
+        self.assertEqual("first", callme("second"))
+        self.assertEqual({}, Registry().revalidating)
+
+        self.assertEqual("first", callme("second"))
+        future, ttl, stale = Registry().revalidating["foo"]
+        self.assertEqual(timedelta(seconds=10), ttl)
+        self.assertEqual(timedelta(seconds=5), stale)
+        self.assertEqual("second", future.result())
+
+        self.assertEqual("second", callme("third"))
+        self.assertEqual(("second", 20), Registry.get("cache", "foo"))
+        self.assertEqual({}, Registry().revalidating)
+
+        Registry.cache_set("foo", "third", timedelta(seconds=10), 3)
+        self.assertEqual("third", callme("fourth"))
+        self.assertEqual(13, Registry.get("cache_index", "foo")[0])
+        self.assertEqual(18, Registry().accessed["foo"][0])
+        Registry.revalidated(wait=True)
+        self.assertEqual(("fourth", 40), Registry.get("cache", "foo"))
+        self.assertEqual(45, Registry.get("cache_index", "foo")[0])
+
+        self.assertEqual("fifth", callme("fifth"))
+        self.assertEqual((4, 2), Registry.cache_info()[:2])
+
+    @mock.patch("pytuber.storage.time.time")
+    def test_cache_revalidate_failure(self, time):
+        def fail():
+            raise ValueError()
+
+        time.side_effect = [20, 21]
+        Registry.cache_set("foo", "first", timedelta(seconds=10), 0)
+        self.assertEqual(
+            "first",
+            Registry.cache("foo", fail, timedelta(seconds=10), stale=timedelta(1)),
+        )
+        Registry.revalidated(wait=True)
+        self.assertEqual(("first", 10), Registry.get("cache", "foo"))
+
+    def test_sweep(self):
+        Registry.set("cache", "a", ["a", 10])
+        Registry.set("cache", "b", ["b", 20])
+        Registry.set("cache", "d", ["d", 10])
+        Registry.set("cache_index", "b", [20, 5, 9])
+        Registry.set("cache_index", "c", [20, 5, 11])
+        Registry.set("cache_index", "d", [10, 5, 9])
+
+        self.assertEqual(0, Registry.sweep(now=5))
+        self.assertEqual(
+            {"a": [None, 0, 9], "b": [20, 5, 9], "d": [10, 5, 9]},
+            Registry.get("cache_index"),
+        )
+
+        self.assertEqual(1, Registry.sweep(now=15))
+        self.assertEqual({"a": ["a", 10], "b": ["b", 20]}, Registry.get("cache"))
+        self.assertEqual(
+            {"a": [None, 0, 9], "b": [20, 5, 9]}, Registry.get("cache_index")
+        )
+        self.assertEqual(0, Registry.sweep(now=15))
+
+        with mock.patch.object(Registry, "cache_max_entries", new=1):
+            self.assertEqual(1, Registry.sweep(now=15))
+        self.assertEqual({"b": ["b", 20]}, Registry.get("cache"))
+
+
+class RegistryDatabaseTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "storage.db")
+
+    def tearDown(self):
+        Registry.clear()
+        Registry._obj = {}
+        shutil.rmtree(self.tmp)
+
+    def reload(self):
+        Registry.clear()
+        Registry._obj = {}
+        return Registry.from_file(self.path)
+
+    def test_from_file_imports_legacy_json(self):
+        data = {
+            "version": "22.5",
+            "playlist": {"a": {"id": "a"}, "b": {"id": "b"}},
+            "last.fm_tag_list": [[], 1],
+        }
+        with open(self.path, "w") as fp:
+            json.dump(data, fp)
+
+        Registry.from_file(self.path)
+
+        expected = {
+            "version": "22.5",
+            "playlist": {"a": {"id": "a"}, "b": {"id": "b"}},
+            "cache": {"last.fm_tag_list": [[], 1]},
+        }
+        self.assertTrue(Database.is_database(self.path))
+        self.assertTrue(os.path.exists(f"{self.path}.json"))
+        self.assertEqual(expected, Registry())
+        self.assertEqual(expected, self.reload())
+
+    def test_from_file_reads_rows_on_access(self):
+        Registry.set("playlist", "a", {"id": "a"})
+        Registry.set("playlist", "b", {"id": "b"})
+        Registry.persist(self.path)
+
+        self.reload()
+        table = Registry()["playlist"]
+        self.assertIsInstance(table, Table)
+        self.assertEqual(0, dict.__len__(table))
+
+        self.assertEqual({"id": "b"}, Registry.get("playlist", "b"))
+        self.assertTrue(Registry.exists("playlist", "a"))
+        self.assertFalse(Registry.exists("playlist", "c"))
+        self.assertEqual(2, dict.__len__(table))
+        self.assertFalse(table.loaded)
+
+        with mock.patch.object(Database, "rows") as rows:
+            self.assertEqual(["a", "b"], list(table.keys()))
+            Registry.remove("playlist", "a")
+            Registry.set("playlist", "c", {"id": "c"})
+            self.assertEqual(["b", "c"], list(table))
+            self.assertEqual(0, rows.call_count)
+            self.assertFalse(table.loaded)
+
+        self.assertEqual({"b": {"id": "b"}, "c": {"id": "c"}}, table)
+        self.assertTrue(table.loaded)
+
+    def test_write(self):
+        database = Database(self.path)
+        database.create("track")
+        database.write("track", "a", 1)
+        database.write("track", "b", 2)
+        database.write("track", "a", 3)
+
+        self.assertEqual([("a", 3), ("b", 2)], list(database.rows("track")))
+        database.connection.close()
+
+    def test_persist_writes_changed_rows(self):
+        Registry.set("track", "a", {"id": "a"})
+        Registry.set("track", "b", {"id": "b"})
+        Registry.set("history", {"limit": 10})
+        Registry.set("version", "1")
+        Registry.persist(self.path)
+
+        self.reload()
+        with mock.patch.object(Database, "write", wraps=Registry().database.write) as w:
+            Registry.set("track", "a", "youtube_id", "y")
+            Registry.remove("track", "b")
+            Registry.set("history", {"user": "foo"})
+            Registry.remove("version")
+            Registry.persist(self.path)
+            written = sorted(call[0][:2] for call in w.call_args_list)
+
+        self.assertEqual([("history", "user"), ("track", "a")], written)
+
+        expected = {
+            "track": {"a": {"id": "a", "youtube_id": "y"}},
+            "history": {"user": "foo"},
+        }
+        self.assertEqual(expected, self.reload())
+
+    def test_remove_before_load(self):
+        Registry.set("track", "a", {"id": "a"})
+        Registry.persist(self.path)
+
+        self.reload()
+        Registry.remove("track", "a")
+        self.assertFalse(Registry.exists("track", "a"))
+        self.assertEqual([], list(Registry.get("track").keys()))
+
+        with self.assertRaises(KeyError):
+            Registry.remove("track", "a")
+
+    def test_changed(self):
+        self.assertEqual([], Registry.changed())
+
+        Registry.set("track", "a", {"id": "a"})
+        Registry.set("version", "1")
+        self.assertEqual(["version", "track"], Registry.changed())
+
+        Registry.persist(self.path)
+        self.assertEqual([], Registry.changed())
+
+        Registry.set("track", "a", {"id": "a"})
+        Registry.set("version", "1")
+        self.assertEqual([], Registry.changed())
+
+        Registry.clear()
+        Registry.set("track", "a", "id", "b")
+        self.assertEqual(["track"], Registry.changed())
+
+    def test_modified(self):
+        Registry.set("version", "1")
+        Registry.persist(self.path)
+        Registry.set("track", "a", {"id": "a"})
+        self.assertEqual([], Registry.changed())
+        self.assertEqual({"version", "track"}, Registry.modified())
+
+        Registry.clear()
+        self.assertEqual(set(), Registry.modified())
+
+    def test_persist_skips_when_nothing_changed(self):
+        Registry.persist(self.path)
+        self.assertFalse(os.path.exists(self.path))
+
+        Registry.set("version", "1")
+        Registry.persist(self.path)
+
+        self.reload()
+        Registry.get("version")
+        with mock.patch.object(Database, "create") as create:
+            Registry.persist(self.path)
+            self.assertEqual(0, create.call_count)
+
+    def test_changes_are_journaled(self):
+        Registry.from_file(self.path)
+        Registry.set("track", "a", {"id": "a"})
+        Registry.set("version", "1")
+
+        journal = Registry().database.journal
+        self.assertTrue(os.path.getsize(journal) > 0)
+
+        connection = sqlite3.connect(self.path)
+        self.assertEqual("wal", connection.execute("PRAGMA journal_mode").fetchone()[0])
+        self.assertEqual(
+            [("a", '{"id": "a"}')],
+            connection.execute("SELECT id, value FROM track").fetchall(),
+        )
+        connection.close()
+
+        Registry._obj = {}
+        expected = {"track": {"a": {"id": "a"}}, "version": "1"}
+        self.assertEqual(expected, Registry.from_file(self.path))
+
+    @mock.patch.object(Database, "journal_limit", new=0)
+    def test_persist_compacts_journal(self):
+        Registry.from_file(self.path)
+        Registry.set("track", "a", {"id": "a"})
+
+        journal = Registry().database.journal
+        self.assertTrue(os.path.getsize(journal) > 0)
+
+        Registry.set("track", "b", {"id": "b"})
+        Registry.persist(self.path)
+        self.assertEqual(0, os.path.getsize(journal))
+
+    @mock.patch.object(Database, "max_variables", new=2)
+    def test_get_many(self):
+        for key in "abcde":
+            Registry.set("track", key, {"id": key})
+        Registry.persist(self.path)
+
+        self.reload()
+        Registry.get("track", "a")
+        Registry.remove("track", "b")
+        with mock.patch.object(
+            Database, "read_many", wraps=Registry().database.read_many
+        ) as read_many:
+            actual = Registry.get_many("track", ["e", "a", "b", "c", "x"])
+            read_many.assert_called_once_with("track", ["e", "b", "c", "x"])
+
+        expected = {"e": {"id": "e"}, "a": {"id": "a"}, "c": {"id": "c"}}
+        self.assertEqual(expected, actual)
+        self.assertFalse(Registry()["track"].loaded)
+        self.assertEqual({}, Registry.get_many("playlist", ["a"]))
+
+    def test_transaction(self):
+        Registry.set("version", "1")
+        Registry.persist(self.path)
+        with mock.patch.object(
+            Database, "write", wraps=Registry().database.write
+        ) as write:
+            with Registry.transaction():
+                Registry.set("track", "a", {"id": "a"})
+                with Registry.transaction():
+                    Registry.set("track", "b", {"id": "b"})
+                self.assertEqual(0, write.call_count)
+                self.assertTrue(Registry.changed())
+
+            self.assertEqual(2, write.call_count)
+            self.assertFalse(Registry.changed())
+
+        self.assertEqual({"a": {"id": "a"}, "b": {"id": "b"}}, self.reload()["track"])
+
+    def test_persist_sweeps_cache(self):
+        Registry.cache_set("a", "a", timedelta(seconds=10), 1)
+        Registry.cache_set("b", "b", timedelta(seconds=60), time.time())
+        Registry.persist(self.path)
+
+        self.reload()
+        self.assertEqual(["b"], list(Registry.get("cache")))
+        self.assertEqual(["b"], list(Registry.get("cache_index")))
+
+    def test_persist_keeps_stale_cache(self):
+        now = time.time()
+        Registry.from_file(self.path)
+        Registry.cache_set("tags", "a", timedelta(seconds=10), now - 60, timedelta(1))
+        Registry.persist(self.path)
+
+        self.reload()
+        Registry.persist(self.path)
+        self.assertEqual(("a", now - 50), tuple(Registry.get("cache", "tags")))
+
+        func = mock.Mock(return_value="b")
+        self.assertEqual(
+            "a", Registry.cache("tags", func, timedelta(1), stale=timedelta(1))
+        )
+        Registry.revalidated(wait=True)
+        func.assert_called_once_with()
+        self.assertEqual("b", Registry.get("cache", "tags")[0])
+
+    @mock.patch("pytuber.storage.time.time")
+    def test_persist_writes_cache_hits_with_other_changes(self, time):
+        time.return_value = 10
+        Registry.from_file(self.path)
+        Registry.cache_set("foo", "a", timedelta(seconds=100), 0)
+        Registry.persist(self.path)
+
+        self.reload()
+        func = mock.Mock()
+        with mock.patch.object(
+            Database, "write", wraps=Registry().database.write
+        ) as write:
+            self.assertEqual("a", Registry.cache("foo", func, timedelta(1)))
+            Registry.persist(self.path)
+            self.assertEqual(0, write.call_count)
+            self.assertEqual([100, 0, 12], Registry.get("cache_index", "foo"))
+
+            time.return_value = 20
+            Registry.set("version", "1")
+            self.assertEqual("a", Registry.cache("foo", func, timedelta(1)))
+            Registry.persist(self.path)
+
+        func.assert_not_called()
+        self.assertEqual({}, Registry().accessed)
+        self.assertEqual([100, 20, 12], self.reload()["cache_index"]["foo"])
+
+    def test_persist_skips_running_revalidations(self):
+        Registry.from_file(self.path)
+        Registry.cache_set("tags", "a", timedelta(seconds=10), time.time() - 60)
+
+        started, release = threading.Event(), threading.Event()
+
+        def func():
+            started.set()
+            release.wait(5)
+            return "b"
+
+        self.assertEqual(
+            "a", Registry.cache("tags", func, timedelta(1), stale=timedelta(1))
+        )
+        self.assertTrue(started.wait(5))
+        Registry.persist(self.path)
+        self.assertEqual("a", Registry.get("cache", "tags")[0])
+        self.assertIn("tags", Registry().revalidating)
+
+        release.set()
+        Registry.revalidated(wait=True)
+        self.assertEqual("b", Registry.get("cache", "tags")[0])
@@ -1,8 +1,11 @@
+from concurrent.futures import ThreadPoolExecutor
 from unittest import mock
 from unittest import TestCase
 from unittest.mock import PropertyMock
 
+from pytuber.storage import Registry
 from pytuber.utils import date
+from pytuber.utils import init_registry
 from pytuber.utils import spinner
 
 
@@ -12,7 +15,7 @@ class UtilsTests(TestCase):
         self.assertEqual("-", date(0))
         self.assertEqual("2019-02-17 09:02", date(1550394167))
 
-    @mock.patch("pytuber.utils.yaspin")
+    @mock.patch("yaspin.yaspin")
     def test_spinner(self, yaspin):
         type(yaspin.return_value).green = PropertyMock(return_value=yaspin)
         with spinner("foo") as sp:
@@ -22,7 +25,7 @@ class UtilsTests(TestCase):
         yaspin.return_value.stop.assert_called_once_with()
 
     @mock.patch("click.secho")
-    @mock.patch("pytuber.utils.yaspin")
+    @mock.patch("yaspin.yaspin")
     def test_spinner_with_exception(self, yaspin, secho):
         type(yaspin.return_value).green = PropertyMock(return_value=yaspin)
         with spinner("foo"):
@@ -31,3 +34,29 @@ class UtilsTests(TestCase):
         yaspin.return_value.start.assert_called_once_with()
         yaspin.return_value.stop.assert_called_once_with()
         secho.assert_called_once_with("Fatal")
+
+    @mock.patch("yaspin.yaspin")
+    def test_spinner_in_background(self, yaspin):
+        def run():
+            with spinner("foo") as sp:
+                self.assertIsNone(sp)
+                raise Exception("Fatal")
+
+        with ThreadPoolExecutor() as executor:
+            with self.assertRaises(Exception) as cm:
+                executor.submit(run).result()
+
+        self.assertEqual("Fatal", str(cm.exception))
+        yaspin.assert_not_called()
+
+    @mock.patch.object(Registry, "set")
+    @mock.patch.object(Registry, "from_file")
+    def test_init_registry(self, from_file, set):
+        self.addCleanup(Registry.clear)
+        Registry()["version"] = "1"
+        init_registry("foo", "1")
+        from_file.assert_called_once_with("foo")
+        self.assertEqual(0, set.call_count)
+
+        init_registry("foo", "2")
+        set.assert_called_once_with("version", "2")